@@ -0,0 +1,12 @@
+#!/usr/bin/env python3
+#
+# Same as "cardcrawler batch", for setups that still run this script.
+#
+
+import sys
+
+from cardcrawler import cli
+
+
+if __name__ == "__main__":
+    sys.exit(cli.main(['batch'] + sys.argv[1:]))
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+#
+# Compare the speed of extracting the csv columns from amex transactions using
+# get_parsed_field() for every cell against the precompiled extractor.
+#
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from cardcrawler import amex
+
+
+def synthetic_transaction(n):
+    t = {
+        'charge_date': '2021-03-{:02d}'.format(n % 28 + 1),
+        'post_date': '2021-03-{:02d}'.format(n % 28 + 1),
+        'reference_id': '{:024d}'.format(n),
+        'description': 'MERCHANT {}'.format(n % 500),
+        'amount': round(random.uniform(1, 5000), 2),
+        'type': 'DEBIT',
+        'extended_details': {
+            'additional_attributes': {'point_of_service_data_code': '1000001'},
+            'merchant': {
+                'display_name': 'Merchant {}'.format(n % 500),
+                'name': 'MERCHANT {}'.format(n % 500),
+                'address': {'country_name': 'SWEDEN', 'iso_numeric_country_code': '752'},
+            },
+        },
+    }
+    # Some fields on the way to a column are not objects at all
+    if n % 7 == 0:
+        t['extended_details']['merchant'] = None
+    elif n % 11 == 0:
+        t['extended_details']['merchant']['address'] = ['SWEDEN']
+    elif n % 13 == 0:
+        t['extended_details'] = []
+    # Only some transactions are in a foreign currency
+    if n % 5 == 0:
+        t['foreign_details'] = {
+            'amount': '12.50',
+            'commission_amount': '0.25',
+            'iso_alpha_currency_code': 'EUR',
+            'exchange_rate': '10.51',
+        }
+    return t
+
+
+def bench(name, rows, func):
+    start = time.perf_counter()
+    for t in rows:
+        func(t)
+    elapsed = time.perf_counter() - start
+    print("{:<12} {:>10.0f} rows/second".format(name, len(rows) / elapsed))
+    return elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark amex csv column extraction")
+    parser.add_argument('--rows', type=int, default=200000, help='Number of synthetic transactions')
+    args = parser.parse_args()
+
+    rows = [synthetic_transaction(n) for n in range(args.rows)]
+    columns = amex.csvcolumns
+    compiled = amex.compile_columns(columns)
+
+    # Make sure we're comparing things that give the same result
+    for t in rows[:1000]:
+        assert compiled(t) == [amex.get_parsed_field(t, c) for c in columns]
+
+    old = bench('reduce', rows, lambda t: [amex.get_parsed_field(t, c) for c in columns])
+    new = bench('compiled', rows, compiled)
+    print("Speedup: {:.1f}x".format(old / new))
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+#
+# Compare writing and loading transactions as csv and in the columnar format,
+# both in time and file size.
+#
+
+import argparse
+import csv
+import datetime
+import os
+import sys
+import tempfile
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import standinbank
+from cardcrawler import columnar
+from cardcrawler.transaction import Transaction
+
+
+def load_csv(filename):
+    # What loading a csv export into transactions takes
+    with open(filename, newline='') as f:
+        reader = csv.reader(f)
+        columns = next(reader)
+        for row in reader:
+            values = dict(zip(columns, (v or None for v in row)))
+            for k in ('charge_date', 'post_date'):
+                values[k] = values[k] and datetime.date.fromisoformat(values[k])
+            for k in ('amount', 'foreign_amount'):
+                values[k] = values[k] and Decimal(values[k])
+            yield Transaction(**values)
+
+
+def timed(name, func):
+    start = time.perf_counter()
+    result = func()
+    print("{:<20} {:>8.2f}s".format(name, time.perf_counter() - start))
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark csv against columnar transaction files")
+    parser.add_argument('--rows', type=int, default=1000000, help='Number of transactions')
+    args = parser.parse_args()
+
+    # Use the stand-in's synthetic amex transactions, for a few cards
+    fixtures = standinbank.synthetic_fixtures(args.rows // 4)
+    txs = []
+    for card in range(4):
+        txs += [Transaction.from_amex(t, 'CARD{}'.format(card)) for statement in fixtures['amex']['transactions'].values() for t in statement]
+
+    tmpdir = tempfile.mkdtemp(prefix='cardcrawler-bench-')
+    csvfile = os.path.join(tmpdir, 'transactions.csv')
+    colfile = os.path.join(tmpdir, 'transactions.col')
+
+    def _write_csv():
+        with open(csvfile, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(Transaction.__slots__)
+            for t in txs:
+                writer.writerow(t.values())
+
+    def _write_columnar():
+        with open(colfile, 'wb') as f:
+            writer = columnar.ColumnarWriter(f)
+            for t in txs:
+                writer.write(t)
+            writer.close()
+
+    def _load_columnar():
+        with open(colfile, 'rb') as f:
+            return list(columnar.ColumnarReader(f))
+
+    def _load_columns():
+        # Loading into columns, without making objects for every row
+        with open(colfile, 'rb') as f:
+            return sum(len(b['amount']) for b in columnar.ColumnarReader(f).blocks())
+
+    timed('write csv', _write_csv)
+    timed('write columnar', _write_columnar)
+    loaded = timed('load csv', lambda: list(load_csv(csvfile)))
+    assert loaded == txs
+    loaded = timed('load columnar', _load_columnar)
+    assert loaded == txs
+    timed('load columns', _load_columns)
+    print("{} transactions, csv {} kB, columnar {} kB".format(len(txs), os.path.getsize(csvfile) // 1024, os.path.getsize(colfile) // 1024))
+    os.remove(csvfile)
+    os.remove(colfile)
+    os.rmdir(tmpdir)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+#
+# Benchmark the crawlers against the local stand-in bank sites, at a number of
+# sizes (transactions per bank).
+#
+# Extraction measures how fast the transactions are parsed and written out once
+# we have them, without a browser. Amex http additionally fetches all statements
+# from the stand-in api. End-to-end runs each crawler as a process against the
+# stand-in (which needs chrome and chromedriver), and reports the wall time.
+#
+
+import argparse
+import datetime
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import standinbank
+from cardcrawler import amex
+from cardcrawler import outputwriter
+from cardcrawler import revolut
+from cardcrawler import seb
+
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def revolut_page_row(t):
+    # A transaction the way get_transaction_groups() reads it from the page
+    started = datetime.datetime.fromtimestamp(t['startedDate'] / 1000)
+    if t['state'] == 'PENDING':
+        timeval = 'Pending'
+    elif t['state'] == 'DECLINED':
+        timeval = 'Failed'
+    else:
+        timeval = started.strftime('%H:%M ') + (started.hour < 12 and 'AM' or 'PM')
+    return {
+        'id': t['id'],
+        'title': t['description'],
+        'time': timeval,
+        'amount': '{} {} {:,.2f}'.format(t['amount'] < 0 and '-' or '+', t['currency'], abs(t['amount']) / 100),
+    }
+
+
+def report(size, name, rows, elapsed):
+    print("{:>8} {:<16} {:>8} rows {:>9.3f}s {:>12.0f} rows/second".format(size, name, rows, elapsed, rows / elapsed if elapsed else 0))
+
+
+def bench_extraction(size, fixtures):
+    amextxs = [t for txs in fixtures['amex']['transactions'].values() for t in txs]
+    body = json.dumps({'transactions': amextxs})
+    start = time.perf_counter()
+    writer = outputwriter.get_writer('csv', io.StringIO(), amex.csvcolumns, tocsv=amex.compile_columns(amex.csvcolumns))
+    for t in json.loads(body)['transactions']:
+        writer.write(t)
+    writer.close()
+    report(size, 'amex', len(amextxs), time.perf_counter() - start)
+
+    sebfixtures = fixtures['seb']
+    start = time.perf_counter()
+    rows = [seb.parse_transaction_row(r, datetime.date.today().year) for r in sebfixtures['uninvoiced']]
+    for invoice in sebfixtures['invoices']:
+        year = invoice['title'].split()[1]
+        rows += [seb.parse_transaction_row(r, year) for r in invoice['rows']]
+    writer = outputwriter.get_writer('csv', io.StringIO(), seb.columns)
+    for r in rows:
+        writer.write(r)
+    writer.close()
+    report(size, 'seb', len(rows), time.perf_counter() - start)
+
+    revolutfixtures = fixtures['revolut']
+    page = [revolut_page_row(t) for t in revolutfixtures]
+    today = datetime.date.today()
+    start = time.perf_counter()
+    rows = [r for r in (revolut.parse_transaction(t, today) for t in page) if r]
+    report(size, 'revolut', len(rows), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    rows = [r for r in (revolut.parse_api_transaction(t) for t in revolutfixtures) if r]
+    report(size, 'revolut api', len(rows), time.perf_counter() - start)
+
+
+def bench_http(size, fixtures, baseurl, workers):
+    amex.baseurl = baseurl
+    sess = amex.create_session(workers)
+    sess.post(baseurl + '/sv-se/account/login', data={}).raise_for_status()
+    token = fixtures['amex']['cards'][0]['token']
+    ends = [s['statement_end_date'] for s in fixtures['amex']['statement_periods']]
+    start = time.perf_counter()
+    rows = 0
+    for statementend, transactions, e in amex.fetch_statements(sess, token, ends, workers, pending=True):
+        if e:
+            raise e
+        rows += len(transactions)
+    report(size, 'amex http', rows, time.perf_counter() - start)
+
+
+def bench_end_to_end(size, fixtures, baseurl, args, tmpdir):
+    common = ['--baseurl', baseurl, '--format', 'ndjson', '--chrome', args.chrome, '--chromedriver', args.chromedriver]
+    if args.nosandbox:
+        common.append('--nosandbox')
+    since = str(datetime.date.today() - datetime.timedelta(days=args.days + 1))
+    crawlers = [
+        ('amex', ['amex', 'benchmark', '--password', 'x', '--months', str(len(fixtures['amex']['statement_periods']))]),
+        ('seb', ['seb', '197001011234', 'saseurobonus', '--months', str(len(fixtures['seb']['invoices']))]),
+        ('revolut', ['revolut', '0701234567', '--password', '1234', '--since', since]),
+        ('revolut --api', ['revolut', '0701234567', '--password', '1234', '--since', since, '--api']),
+    ]
+    for name, command in crawlers:
+        output = os.path.join(tmpdir, 'output')
+        log = os.path.join(tmpdir, '{}-{}.log'.format(name.replace(' --', '-'), size))
+        start = time.perf_counter()
+        with open(log, 'w') as err:
+            returncode = subprocess.call(
+                [sys.executable, '-m', 'cardcrawler'] + command + common + ['--output', output],
+                stdout=subprocess.DEVNULL, stderr=err, cwd=root,
+            )
+        elapsed = time.perf_counter() - start
+        if returncode:
+            print("{:>8} {:<16} failed, see {}".format(size, name, log))
+            continue
+        with open(output) as f:
+            rows = sum(1 for l in f)
+        report(size, name + ' e2e', rows, elapsed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the crawlers against the stand-in bank sites")
+    parser.add_argument('--sizes', type=str, default='100,10000,100000', help='Comma separated numbers of transactions per bank')
+    parser.add_argument('--statements', type=int, default=12, help='Number of amex statements and seb invoices to spread the transactions over')
+    parser.add_argument('--days', type=int, default=365, help='Number of days of revolut transactions')
+    parser.add_argument('--workers', type=int, default=4, help='Number of statements to fetch in parallel from amex')
+    parser.add_argument('--e2e', action='store_true', help='Also run the crawlers end-to-end, which needs chrome')
+    parser.add_argument('--chrome', type=str, default='chrome', help='Path to chrome browser to use')
+    parser.add_argument('--chromedriver', type=str, default='chromedriver', help='Path to chromedriver binary to use')
+    parser.add_argument('--nosandbox', action='store_true', help='Disable chrome sandbox (used in docker)')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='cardcrawler-bench-')
+    for size in [int(s) for s in args.sizes.split(',')]:
+        fixtures = standinbank.synthetic_fixtures(size, args.statements, args.days)
+        bank = standinbank.StandinBank(fixtures)
+        baseurl = bank.start()
+        try:
+            bench_extraction(size, fixtures)
+            bench_http(size, fixtures, baseurl, args.workers)
+            if args.e2e:
+                bench_end_to_end(size, fixtures, baseurl, args, tmpdir)
+        finally:
+            bank.stop()
+    print("Logs are in {}".format(tmpdir))
@@ -0,0 +1,525 @@
+#!/usr/bin/env python3
+#
+# Local stand-in for the bank sites, so the crawlers can be run (and timed)
+# without touching the real ones. Serves all three sites from one base url, to be
+# given to the crawlers with --baseurl:
+#
+#  - amex: the login form, the dashboard with the cards in __INITIAL_STATE__, and
+#    the statement_periods and transactions json api
+#  - seb: the card site with BankID login (approved right away), the uninvoiced
+#    transactions, and the invoice list and invoices
+#  - revolut: the passcode login (approved in the "app" right away), and the
+#    transaction list that loads more from the json api when scrolled
+#
+# The transactions are synthetic, or read from a fixtures file in the same format
+# as written by --save. Nothing records the real sites: --save only writes what
+# is being served, so a fixtures file with real transactions has to be put
+# together by hand (the amex transactions are the same as in the crawler's json
+# output).
+#
+
+import argparse
+import datetime
+import http.cookies
+import http.server
+import json
+import random
+import secrets
+import sys
+import threading
+import urllib.parse
+import uuid
+
+
+_months_sv = ['Januari', 'Februari', 'Mars', 'April', 'Maj', 'Juni', 'Juli', 'Augusti', 'September', 'Oktober', 'November', 'December']
+
+_merchants = ['ICA NARA', 'SL', 'SYSTEMBOLAGET', 'SPOTIFY', 'PRESSBYRAN', 'COOP', 'SAS', 'ESPRESSO HOUSE', 'APOTEKET', 'CLAS OHLSON']
+
+
+def _add_months(d, months):
+    # Same day of month (clamped to 28) some months before or after
+    month = d.month - 1 + months
+    return d.replace(year=d.year + month // 12, month=month % 12 + 1, day=min(d.day, 28))
+
+
+def _amex_transaction(rng, first, last):
+    charged = first + datetime.timedelta(days=rng.randrange(max((last - first).days, 0) + 1))
+    merchant = rng.choice(_merchants)
+    t = {
+        'identifier': 'AT{:012d}'.format(rng.getrandbits(40)),
+        'reference_id': '{:024d}'.format(rng.getrandbits(64)),
+        'charge_date': str(charged),
+        'post_date': str(min(charged + datetime.timedelta(days=rng.randrange(3)), last)),
+        'description': '{} STOCKHOLM'.format(merchant),
+        'amount': round(rng.uniform(10, 3000), 2),
+        'type': rng.random() < 0.03 and 'CREDIT' or 'DEBIT',
+        'extended_details': {
+            'additional_attributes': {'point_of_service_data_code': '1000001'},
+            'merchant': {
+                'display_name': merchant.title(),
+                'name': merchant,
+                'address': {'country_name': 'SWEDEN', 'iso_numeric_country_code': '752'},
+            },
+        },
+    }
+    if rng.random() < 0.2:
+        t['foreign_details'] = {
+            'amount': '{:.2f}'.format(rng.uniform(1, 300)),
+            'commission_amount': '0.25',
+            'iso_alpha_currency_code': 'EUR',
+            'exchange_rate': '11.2',
+        }
+    return t
+
+
+def amex_fixtures(rng, n, statements, today):
+    # Statements end on the 15th, newest (the currently open one) first, with the
+    # transactions spread evenly over them. The open statement also has a few
+    # pending transactions, which don't have a reference_id yet.
+    end = today.day <= 15 and today.replace(day=15) or _add_months(today.replace(day=15), 1)
+    ends = [_add_months(end, -i) for i in range(statements)]
+    periods = []
+    transactions = {}
+    for i, e in enumerate(ends):
+        start = _add_months(e, -1) + datetime.timedelta(days=1)
+        periods.append({
+            'index': i,
+            'statement_start_date': str(start),
+            'statement_end_date': str(e),
+        })
+        txs = [_amex_transaction(rng, start, min(e, today)) for j in range(n // statements + (i < n % statements and 1 or 0))]
+        txs.sort(key=lambda t: t['charge_date'], reverse=True)
+        transactions[str(e)] = txs
+    pending = [_amex_transaction(rng, max(today - datetime.timedelta(days=3), _add_months(end, -1) + datetime.timedelta(days=1)), today) for j in range(max(n // 50, 1))]
+    for t in pending:
+        del t['reference_id']
+        t['post_date'] = None
+    return {
+        'cards': [{'token': 'STANDIN0TOKEN1', 'display_account_number': '12345'}],
+        'statement_periods': periods,
+        'transactions': transactions,
+        'pending': {str(end): pending},
+    }
+
+
+def _seb_amount(v):
+    # Swedish formatting, with non-breaking spaces and a real minus sign
+    s = '{:,.2f}'.format(abs(v)).replace(',', '\xa0').replace('.', ',')
+    return v < 0 and '−' + s or s
+
+
+def _seb_rows(rng, n, first, last):
+    rows = []
+    for i in range(n):
+        charged = first + datetime.timedelta(days=rng.randrange(max((last - first).days, 0) + 1))
+        posted = min(charged + datetime.timedelta(days=rng.randrange(3)), last)
+        foreign = rng.random() < 0.2
+        rows.append([
+            'tx{}'.format(rng.getrandbits(48)),
+            charged.strftime('%m-%d'),
+            posted.strftime('%m-%d'),
+            rng.choice(_merchants),
+            'STOCKHOLM',
+            foreign and 'EUR' or 'SEK',
+            foreign and _seb_amount(rng.uniform(1, 300)) or '',
+            _seb_amount(rng.random() < 0.03 and -rng.uniform(10, 500) or rng.uniform(10, 3000)),
+        ])
+    rows.sort(key=lambda r: r[2], reverse=True)
+    return rows
+
+
+def seb_fixtures(rng, n, invoices, today):
+    # A few uninvoiced transactions from this month, and the rest spread over one
+    # invoice per month before that.
+    uninvoiced = min(n, max(n // 20, 1))
+    month = today.replace(day=1)
+    result = {'uninvoiced': _seb_rows(rng, uninvoiced, month, today), 'invoices': []}
+    n -= uninvoiced
+    for i in range(invoices):
+        last = month - datetime.timedelta(days=1)
+        month = last.replace(day=1)
+        result['invoices'].append({
+            'id': str(i + 1),
+            'title': '{} {}'.format(_months_sv[month.month - 1], month.year),
+            'date': str(last + datetime.timedelta(days=10)),
+            'rows': _seb_rows(rng, n // invoices + (i < n % invoices and 1 or 0), month, last),
+        })
+    return result
+
+
+def revolut_fixtures(rng, n, days, today):
+    # Transactions as the json api returns them, newest first, spread over the
+    # last days. The last two days have some pending ones, and there are a few
+    # declined transactions and currency exchanges that shouldn't be crawled.
+    now = datetime.datetime.combine(today, datetime.time(23, 59))
+    transactions = []
+    for i in range(n):
+        started = now - datetime.timedelta(seconds=rng.randrange(days * 86400))
+        t = {
+            'id': str(uuid.UUID(int=rng.getrandbits(128))),
+            'startedDate': int(started.timestamp() * 1000),
+            'description': rng.choice(_merchants).title(),
+            'amount': -rng.randrange(1000, 300000),
+            'currency': rng.random() < 0.2 and 'EUR' or 'SEK',
+            'state': 'COMPLETED',
+            'type': 'CARD_PAYMENT',
+        }
+        r = rng.random()
+        if r < 0.02:
+            t.update(type='EXCHANGE', description='Bought EUR with SEK')
+        elif r < 0.04:
+            t.update(state='DECLINED')
+        elif r < 0.1 and (now - started).days < 2:
+            t.update(state='PENDING')
+        elif r < 0.12:
+            t.update(type='TOPUP', description='Top-Up by *1234', amount=-t['amount'])
+        transactions.append(t)
+    transactions.sort(key=lambda t: t['startedDate'], reverse=True)
+    return transactions
+
+
+def synthetic_fixtures(n, statements=12, days=365, seed=0, today=None):
+    rng = random.Random(seed)
+    today = today or datetime.date.today()
+    return {
+        'amex': amex_fixtures(rng, n, statements, today),
+        'seb': seb_fixtures(rng, n, statements, today),
+        'revolut': revolut_fixtures(rng, n, days, today),
+    }
+
+
+_amex_login_html = """<!DOCTYPE html>
+<html><head><title>Logga in - American Express</title></head><body>
+<div><button data-testid="granular-banner-button-accept-all" onclick="this.parentNode.remove()">Acceptera alla</button></div>
+<form method="post" action="/sv-se/account/login">
+<input id="eliloUserID" name="UserID">
+<input id="eliloPassword" name="Password" type="password">
+<button id="loginSubmit" type="submit">Logga in</button>
+</form>
+</body></html>
+"""
+
+_amex_dashboard_html = """<!DOCTYPE html>
+<html><head><title>Översikt - American Express</title></head><body>
+<div id="root"></div>
+<script>window.__INITIAL_STATE__ = "{}";</script>
+</body></html>
+"""
+
+_seb_html = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>SEB Kort</title></head><body><div id="app"></div>
+<script>
+function esc(s) {
+  return String(s).replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;').replace(/"/g, '&quot;');
+}
+function get(what, f) {
+  fetch('/nis/standin/' + what).then(function(r) { return r.json(); }).then(f);
+}
+function rows(rs) {
+  return rs.map(function(r) {
+    return '<li class="list-item"><a class="list-item-link" id="' + esc(r[0]) + '" href="#transaction/' + esc(r[0]) + '"></a><ul class="container">' +
+      r.slice(1).map(function(c) { return '<li>' + esc(c) + '</li>'; }).join('') + '</ul></li>';
+  }).join('');
+}
+function logout() {
+  document.cookie = 'standin_seb=; path=/; max-age=0';
+  location.hash = '';
+  render();
+}
+function render() {
+  var app = document.getElementById('app');
+  if (document.cookie.indexOf('standin_seb=1') < 0) {
+    document.title = 'SEB Kort - Logga in';
+    app.innerHTML = '<button id="eidbtn1">Mobilt BankID på annan enhet</button>';
+    document.getElementById('eidbtn1').onclick = function() {
+      setTimeout(function() { document.cookie = 'standin_seb=1; path=/'; render(); }, 200);
+    };
+    return;
+  }
+  document.title = 'Mitt SEB Kort';
+  var top = '<button id="logoutbtn" onclick="logout()">Logga ut</button>';
+  var h = location.hash;
+  if (h == '#uninvoiced') {
+    get('uninvoiced', function(d) {
+      app.innerHTML = top + '<ul id="cardTransactionContentTable">' + rows(d) + '</ul>';
+    });
+  } else if (h == '#invoice') {
+    get('invoices', function(d) {
+      app.innerHTML = top + '<section class="page-content"><ul class="listing">' + d.map(function(i) {
+        return '<li><a href="#invoice/' + esc(i.id) + '">' + esc(i.title) + '</a></li>';
+      }).join('') + '</ul></section>';
+    });
+  } else if (h.indexOf('#invoice/') == 0) {
+    get('invoice/' + h.substring(9), function(d) {
+      app.innerHTML = top + '<table class="invoice-details"><tbody>' +
+        '<tr><td>Kort</td><td>SAS EuroBonus</td></tr>' +
+        '<tr><td>Fakturadatum</td><td>' + esc(d.date) + '</td></tr>' +
+        '<tr><td>Period</td><td>' + esc(d.title) + '</td></tr>' +
+        '</tbody></table><section id="transactionTableContent"><ul class="table">' + rows(d.rows) + '</ul></section>';
+    });
+  } else {
+    app.innerHTML = top + '<section class="overview"><div class="container"><ul>' +
+      '<li><a href="#uninvoiced"><strong>Ej fakturerade köp</strong></a></li>' +
+      '<li><a href="#invoice"><strong>Fakturor</strong></a></li>' +
+      '</ul></div></section>';
+  }
+}
+window.addEventListener('hashchange', render);
+render();
+</script></body></html>
+"""
+
+_revolut_start_html = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Revolut</title></head><body><div id="app">
+<input aria-label="Country" value="+46">
+<input name="phoneNumber">
+<button id="continue"><span>Continue</span></button>
+</div>
+<script>
+var app = document.getElementById('app');
+document.getElementById('continue').onclick = function() {
+  app.innerHTML = '<span>Enter passcode</span><input id="passcode" type="password">';
+  var input = document.getElementById('passcode');
+  var timer = null;
+  input.focus();
+  input.oninput = function() {
+    clearTimeout(timer);
+    if (input.value.length >= 4)
+      timer = setTimeout(approve, 400);
+  };
+};
+function approve() {
+  app.innerHTML = '<span>Confirm the sign-in in the Revolut app</span>';
+  fetch('/api/standin/login', {method: 'POST', credentials: 'same-origin'}).then(function() {
+    setTimeout(function() {
+      app.innerHTML = '<button id="cookies"><span>Allow all cookies</span></button>';
+      document.getElementById('cookies').onclick = function() {
+        app.innerHTML = '<a href="/transactions">Transactions</a>';
+      };
+    }, 200);
+  });
+}
+</script></body></html>
+"""
+
+_revolut_transactions_html = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Revolut</title></head><body><div id="list"></div>
+<script>
+var list = document.getElementById('list');
+var loading = false, done = false, last = null, seen = {};
+function esc(s) {
+  return String(s).replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;');
+}
+function pad(n) {
+  return n < 10 ? '0' + n : '' + n;
+}
+function add(t) {
+  if (seen[t.id])
+    return;
+  seen[t.id] = true;
+  var d = new Date(t.startedDate);
+  var time = t.state == 'PENDING' ? 'Pending' : t.state == 'DECLINED' ? 'Failed' : pad(d.getHours()) + ':' + pad(d.getMinutes()) + (d.getHours() < 12 ? ' AM' : ' PM');
+  var amount = (t.amount < 0 ? '- ' : '+ ') + t.currency + ' ' + (Math.abs(t.amount) / 100).toLocaleString('en-US', {minimumFractionDigits: 2});
+  d.setHours(0, 0, 0, 0);
+  var g = document.querySelector('div[data-group="' + d.getTime() + '"]');
+  if (!g) {
+    g = document.createElement('div');
+    g.setAttribute('role', 'transactions-group');
+    g.setAttribute('data-group', d.getTime());
+    g.innerHTML = '<h3>' + d.toDateString() + '</h3>';
+    list.appendChild(g);
+  }
+  var b = document.createElement('button');
+  b.setAttribute('data-transactionid', t.id);
+  b.style.display = 'block';
+  b.innerHTML = '<span><span>' + esc(t.description) + '</span> <span>' + time + '</span></span> <span>' + amount + '</span>';
+  g.appendChild(b);
+}
+function load() {
+  if (loading || done)
+    return;
+  loading = true;
+  fetch('/api/retail/transactions/last?count=50' + (last ? '&to=' + last : ''), {credentials: 'same-origin'}).then(function(r) {
+    return r.json();
+  }).then(function(page) {
+    loading = false;
+    var before = Object.keys(seen).length;
+    page.forEach(add);
+    if (Object.keys(seen).length == before)
+      done = true;
+    else
+      last = page[page.length - 1].startedDate;
+  });
+}
+window.addEventListener('scroll', function() {
+  if (window.innerHeight + window.scrollY >= document.body.offsetHeight - 500)
+    load();
+});
+load();
+</script></body></html>
+"""
+
+
+class StandinBank(object):
+    def __init__(self, fixtures):
+        self.fixtures = fixtures
+        self.sessions = set()
+        self.requests = 0
+        self.server = None
+
+    def start(self, host='127.0.0.1', port=0):
+        # Start serving in a background thread, and return the base url
+        handler = type('StandinHandler', (Handler,), {'bank': self})
+        self.server = http.server.ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return 'http://{}:{}'.format(*self.server.server_address[:2])
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    bank = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, code, body=b'', ctype='text/html; charset=utf-8', headers=()):
+        if isinstance(body, str):
+            body = body.encode('utf8')
+        self.send_response(code)
+        self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in headers:
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, o, headers=()):
+        self._send(200, json.dumps(o), 'application/json', headers)
+
+    def _logged_in(self):
+        cookies = http.cookies.SimpleCookie(self.headers.get('Cookie', ''))
+        return 'standin_session' in cookies and cookies['standin_session'].value in self.bank.sessions
+
+    def _new_session(self):
+        session = secrets.token_hex(16)
+        self.bank.sessions.add(session)
+        return ('Set-Cookie', 'standin_session={}; Path=/; HttpOnly'.format(session))
+
+    def do_POST(self):
+        self.bank.requests += 1
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        path = urllib.parse.urlparse(self.path).path
+        if path == '/sv-se/account/login':
+            self._send(302, headers=[('Location', '/dashboard'), self._new_session()])
+        elif path == '/api/standin/login':
+            self._json({}, headers=[self._new_session()])
+        else:
+            self._send(404, 'Not found')
+
+    def do_GET(self):
+        self.bank.requests += 1
+        url = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        path = url.path
+        fixtures = self.bank.fixtures
+
+        # Pages
+        if path == '/sv-se/account/login':
+            self._send(200, _amex_login_html)
+        elif path == '/dashboard':
+            if not self._logged_in():
+                return self._send(302, headers=[('Location', '/sv-se/account/login')])
+            self._send(200, _amex_dashboard_html.format(json.dumps(json.dumps(amex_initial_state(fixtures['amex'])))[1:-1]))
+        elif path.startswith('/nis/m/') and path.endswith('/external/t/login/index'):
+            self._send(200, _seb_html)
+        elif path == '/start':
+            self._send(200, _revolut_start_html)
+        elif path == '/transactions':
+            self._send(200, _revolut_transactions_html)
+
+        # Amex api, which needs the login session
+        elif path.startswith('/api/servicing/v1/financials/'):
+            if not self._logged_in():
+                return self._send(302, headers=[('Location', '/sv-se/account/login')])
+            if self.headers.get('account_token', None) not in [c['token'] for c in fixtures['amex']['cards']]:
+                return self._send(400, json.dumps({'error': 'unknown account'}), 'application/json')
+            if path.endswith('/statement_periods'):
+                self._json(fixtures['amex']['statement_periods'])
+            elif path.endswith('/transactions'):
+                # Like amex, at most 1000 at a time, paged with offset
+                end = query.get('statement_end_date', [''])[0]
+                limit = min(int(query.get('limit', ['1000'])[0]), 1000)
+                offset = int(query.get('offset', ['0'])[0])
+                status = query.get('status', ['posted'])[0]
+                txs = fixtures['amex'].get(status == 'pending' and 'pending' or 'transactions', {}).get(end, [])
+                self._json({'total_count': len(txs), 'transactions': txs[offset:offset + limit]})
+            else:
+                self._send(404, 'Not found')
+
+        # The seb page gets its data from here
+        elif path == '/nis/standin/uninvoiced':
+            self._json(fixtures['seb']['uninvoiced'])
+        elif path == '/nis/standin/invoices':
+            self._json([{'id': i['id'], 'title': i['title']} for i in fixtures['seb']['invoices']])
+        elif path.startswith('/nis/standin/invoice/'):
+            invoice = [i for i in fixtures['seb']['invoices'] if i['id'] == path.split('/')[-1]]
+            if not invoice:
+                return self._send(404, 'Not found')
+            self._json(invoice[0])
+
+        # Revolut api, newest first, and older pages by passing the time of the last
+        # one we got as to
+        elif path == '/api/retail/transactions/last':
+            if not self._logged_in():
+                return self._send(401, json.dumps({'message': 'unauthorized'}), 'application/json')
+            count = int(query.get('count', ['50'])[0])
+            to = int(query.get('to', ['0'])[0])
+            txs = fixtures['revolut']
+            if to:
+                txs = [t for t in txs if t['startedDate'] <= to]
+            self._json(txs[:count])
+        else:
+            self._send(404, 'Not found')
+
+
+def amex_initial_state(amex):
+    # The cards in a transit encoded state, the way the dashboard has them
+    products = ['^ ']
+    for c in amex['cards']:
+        products += [c['token'], ['^ ', 'account', ['^ ', 'display_account_number', c['display_account_number']]]]
+    return ['^ ', 'modules', ['^ ', 'axp-myca-root', ['^ ', 'productsList', products]]]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in bank sites for the crawlers")
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on')
+    parser.add_argument('--transactions', type=int, default=1000, help='Number of synthetic transactions for each bank')
+    parser.add_argument('--statements', type=int, default=12, help='Number of amex statements and seb invoices to spread them over')
+    parser.add_argument('--days', type=int, default=365, help='Number of days to spread the revolut transactions over')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the synthetic transactions')
+    parser.add_argument('--fixtures', type=str, help='Serve the transactions in this file instead of synthetic ones')
+    parser.add_argument('--save', type=str, help='Save the transactions served to this file')
+    args = parser.parse_args()
+
+    if args.fixtures:
+        with open(args.fixtures) as f:
+            fixtures = json.load(f)
+    else:
+        fixtures = synthetic_fixtures(args.transactions, args.statements, args.days, args.seed)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(fixtures, f, indent=1)
+
+    bank = StandinBank(fixtures)
+    baseurl = bank.start(args.host, args.port)
+    print("Serving on {}, use --baseurl {}".format(baseurl, baseurl), file=sys.stderr)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        bank.stop()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+#
+# Measure how long the cardcrawler command takes to start, for paths that don't
+# need a browser, and which of the big dependencies each one ends up importing.
+# Every case runs as a new process, and the best of a number of runs is reported.
+#
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from cardcrawler import txstore
+
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Modules that are slow to import, and whether each case imported them
+heavy = ('selenium', 'requests', 'cryptography')
+
+
+def run(command):
+    # Returns (seconds, import seconds, heavy modules imported) of one run
+    start = time.perf_counter()
+    r = subprocess.run([sys.executable, '-X', 'importtime'] + command, cwd=root,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    elapsed = time.perf_counter() - start
+    imported = set()
+    total = 0
+    for l in r.stderr.splitlines():
+        if not l.startswith('import time:') or '|' not in l:
+            continue
+        (self_us, cumulative, name) = l[len('import time:'):].split('|')
+        if not self_us.strip().isdigit():
+            continue
+        total += int(self_us)
+        name = name.strip()
+        if name.split('.')[0] in heavy:
+            imported.add(name.split('.')[0])
+    return elapsed, total / 1e6, imported
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the startup time of the cardcrawler command")
+    parser.add_argument('--runs', type=int, default=10, help='Number of runs of each case')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='cardcrawler-bench-')
+    store = os.path.join(tmpdir, 'store.db')
+    s = txstore.TransactionStore(store, 'seb', '197001011234/saseurobonus')
+    s.update([(str(n), [str(n), '2020-01-01', '2020-01-02', 'SHOP', 'STOCKHOLM', '', '', '12,50']) for n in range(100)])
+    s.close()
+
+    cases = [
+        ('python', ['-c', 'pass']),
+        ('--help', ['-m', 'cardcrawler', '--help']),
+        ('amex --help', ['-m', 'cardcrawler', 'amex', '--help']),
+        ('export', ['-m', 'cardcrawler', 'export', store, '--output', os.devnull]),
+        # What an amex run with a cached session imports before it talks to amex
+        ('amex, no browser', ['-c', 'import cardcrawler.cli, cardcrawler.amex']),
+        # What every crawler script imported before it could even parse --help
+        ('selenium+requests', ['-c', 'import selenium.webdriver, selenium.webdriver.support.ui, requests']),
+    ]
+    for name, command in cases:
+        results = [run(command) for n in range(args.runs)]
+        (elapsed, imports, imported) = min(results)
+        print("{:<20} {:>8.1f}ms {:>8.1f}ms imports  {}".format(name, elapsed * 1000, imports * 1000, ', '.join(sorted(imported)) or '-'))
+
+    os.remove(store)
+    os.rmdir(tmpdir)
@@ -0,0 +1,5 @@
+#
+# Crawlers for credit card transactions from Amex, SEB cards and Revolut. See
+# cardcrawler.cli for the command line, which is also what "python -m
+# cardcrawler" runs.
+#
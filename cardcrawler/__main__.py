@@ -0,0 +1,6 @@
+import sys
+
+from cardcrawler import cli
+
+
+sys.exit(cli.main())
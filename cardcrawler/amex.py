@@ -0,0 +1,709 @@
+#!/usr/bin/env python3
+
+import sys
+import requests
+import requests.adapters
+import json
+import functools
+import os
+import base64
+import concurrent.futures
+from datetime import date
+
+from cardcrawler import browserpool
+from cardcrawler import metrics
+from cardcrawler import outputwriter
+from cardcrawler import responsecache
+from cardcrawler import slots
+from cardcrawler import transaction
+from cardcrawler import txstore
+
+csvcolumns = [
+    'charge_date',
+    'post_date',
+    'reference_id',
+    'description',
+    'amount',
+    'type',
+    'extended_details.additional_attributes.point_of_service_data_code',
+    'extended_details.merchant.display_name',
+    'extended_details.merchant.name',
+    'extended_details.merchant.address.country_name',
+    'extended_details.merchant.address.iso_numeric_country_code',
+    'foreign_details.amount',
+    'foreign_details.commission_amount',
+    'foreign_details.iso_alpha_currency_code',
+    'foreign_details.exchange_rate',
+]
+
+
+# Where the site is. Both can be changed with --baseurl, to run against a local
+# stand-in of the site.
+baseurl = 'https://global.americanexpress.com'
+loginurl = 'https://www.americanexpress.com/sv-se/account/login?inav=iNavLnkLog'
+
+
+def status(msg):
+    print(msg, file=sys.stderr)
+
+
+def _transit_cache_index(code):
+    # Cache references are "^" followed by one or two base-44 digits
+    if len(code) == 2:
+        return ord(code[1]) - 48
+    return (ord(code[1]) - 48) * 44 + ord(code[2]) - 48
+
+
+def decode_initial_state(state):
+    # The react initial state is transit encoded: maps are flattened into lists
+    # of ["^ ", key, value, ...], immutable.js types are tagged as ["~#iM", [...]],
+    # and repeated map keys are replaced by "^<n>" references into a rolling cache.
+    # Decode all of it in one pass into regular dicts and lists, and at the same
+    # time build an index from every map key to all the values stored under it,
+    # so things can be looked up without knowing the exact path to them.
+    cache = []
+    index = {}
+
+    def _string(s, iskey):
+        if s.startswith('^') and s != '^ ':
+            return cache[_transit_cache_index(s)]
+        if len(s) > 3 and (iskey or s.startswith(('~#', '~:', '~$'))):
+            if len(cache) == 44 * 44:
+                cache.clear()
+            cache.append(s)
+        return s
+
+    def _unescape(s):
+        if s.startswith(('~~', '~^', '~:', '~$')):
+            return s[1:] if s[1] in '~^' else s[2:]
+        return s
+
+    def _map(pairs):
+        d = {}
+        for k, v in pairs:
+            try:
+                d[k] = v
+            except TypeError:
+                # Composite keys can't be dict keys, so leave those as lists
+                return [x for kv in pairs for x in kv]
+            index.setdefault(k, []).append(v)
+        return d
+
+    def _decode(o, iskey=False):
+        if isinstance(o, str):
+            return _unescape(_string(o, iskey))
+        if not isinstance(o, list):
+            return o
+        if o and isinstance(o[0], str):
+            first = _string(o[0], False)
+            if first == '^ ':
+                pairs = []
+                for i in range(1, len(o) - 1, 2):
+                    k = _decode(o[i], True)
+                    pairs.append((k, _decode(o[i + 1])))
+                return _map(pairs)
+            if first.startswith('~#') and len(o) == 2:
+                rep = _decode(o[1])
+                if first in ('~#iM', '~#iOM', '~#cmap') and isinstance(rep, list):
+                    return _map(list(zip(rep[::2], rep[1::2])))
+                return rep
+            return [_unescape(first)] + [_decode(x) for x in o[1:]]
+        return [_decode(x) for x in o]
+
+    return _decode(state), index
+
+
+def get_initial_state(txt):
+    # Find the react initial state in the page without running a regexp over
+    # the whole thing. It's a json document inside a javascript string.
+    marker = '__INITIAL_STATE__ = "'
+    start = txt.index(marker) + len(marker)
+    end = txt.index('</script>', start)
+    raw = txt[start:end].rstrip()
+    if raw.endswith('";'):
+        raw = raw[:-2]
+    try:
+        return json.loads(json.loads('"' + raw + '"'))
+    except ValueError:
+        # Not all javascript string escapes are valid json ones
+        return json.loads(raw.replace('\\"', '"').strip())
+
+
+def parse_cards(txt):
+    # Returns a list of the cards on the account, each as a dict with the token
+    # and the last digits of the card number.
+    state, index = decode_initial_state(get_initial_state(txt))
+    cards = []
+    # selectedProduct holds the current one, but productsList has the details
+    for productslist in index.get('productsList', []):
+        if not isinstance(productslist, dict):
+            continue
+        for token, product in productslist.items():
+            account = isinstance(product, dict) and product.get('account', None)
+            if isinstance(account, dict) and 'display_account_number' in account:
+                cards.append({
+                    'token': token,
+                    'display_account_number': account['display_account_number'],
+                })
+        if cards:
+            break
+    return cards
+
+
+def get_cards(sess):
+    r = sess.get(baseurl + '/dashboard')
+    r.raise_for_status()
+    return parse_cards(r.text)
+
+
+def get_parsed_field(transaction, colspec):
+    return functools.reduce(lambda o, k: (o and k in o) and o[k] or None, colspec.split('.'), transaction)
+
+
+def _column_getter(keys):
+    def get(o):
+        for k in keys:
+            # Anything but an object on the way (like a list) has no fields
+            if not isinstance(o, dict):
+                return None
+            o = o.get(k)
+        return o or None
+    return get
+
+
+def compile_columns(columns):
+    # Build a single function that turns a transaction into the list of values
+    # for all columns, with the same result as calling get_parsed_field() for
+    # each of them, but without splitting every column spec for every row.
+    # Missing or empty values become None.
+    getters = [_column_getter(tuple(colspec.split('.'))) for colspec in columns]
+
+    def row(t):
+        return [get(t) for get in getters]
+    return row
+
+
+def get_columns(args):
+    # Columns can be given on the commandline or in a file with one per line. If
+    # the first one starts with a +, the columns are added to the default ones.
+    if args.columnsfile:
+        with open(args.columnsfile) as f:
+            columns = [l.strip() for l in f if l.strip() and not l.startswith('#')]
+    elif args.columns:
+        columns = [c.strip() for c in args.columns.split(',') if c.strip()]
+    else:
+        return csvcolumns
+    if columns and columns[0].startswith('+'):
+        columns = csvcolumns + [columns[0][1:]] + columns[1:]
+    return columns
+
+
+def create_session(workers):
+    sess = requests.session()
+    # Keep one keep-alive connection per worker in the pool, so parallel statement
+    # fetches don't have to reconnect (or wait for a connection) for every request.
+    adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=max(workers, 1))
+    sess.mount('https://', adapter)
+    sess.mount('http://', adapter)
+    metrics.instrument_session(sess)
+    return sess
+
+
+# The most transactions the api returns for one request
+pagesize = 1000
+
+
+def fetch_page(sess, token, statementend, status, offset):
+    # Returns one page of transactions, and the total number of transactions in
+    # the statement if the api tells us.
+    r = sess.get(
+        baseurl + '/api/servicing/v1/financials/transactions',
+        params={
+            'status': status,
+            'limit': pagesize,
+            'offset': offset,
+            'statement_end_date': statementend,
+        },
+        headers={'account_token': token}
+    )
+    r.raise_for_status()
+    data = r.json()
+    return data['transactions'], data.get('total_count', None)
+
+
+def merge_pages(listings):
+    # Put the pages of a statement together, making sure we got all of them. If
+    # transactions moved between pages while we were fetching, the same one can
+    # be on two pages, so only keep the first. Transactions that are not posted
+    # (which we only fetch with pending) get their status right away, the posted
+    # ones only once they have been stored, so they are stored the same way
+    # whether or not pending was asked for.
+    transactions = []
+    seen = set()
+    for status, listing in listings:
+        got = 0
+        for offset in sorted(listing['pages']):
+            for t in listing['pages'][offset]:
+                got += 1
+                txid = transaction_id(t)
+                if txid in seen:
+                    continue
+                seen.add(txid)
+                if status != 'posted':
+                    t.setdefault('status', status)
+                transactions.append(t)
+        if listing['total'] is not None and got < listing['total']:
+            raise Exception("Only got {} of {} {} transactions".format(got, listing['total'], status))
+    return transactions
+
+
+def tag_status(transactions, status):
+    for t in transactions:
+        t.setdefault('status', status)
+
+
+def statement_cache_key(token, statementend):
+    return 'amex/{}/transactions/{}'.format(token, statementend)
+
+
+def fetch_statements(sess, token, statementends, workers, pending=False, cache=None):
+    # Fetch statements using a bounded pool of workers. Results are yielded in the
+    # same order as statementends as (statementend, transactions, exception), where
+    # exception is set (and transactions is None) if that statement failed.
+    #
+    # The first page of every statement is requested right away. Once it tells us
+    # the total, the rest of the pages are requested in parallel. If it doesn't,
+    # we keep asking for the next page for as long as they come back full. With
+    # pending, the pending transactions of statements that are still open are
+    # fetched too, and get a status (see merge_pages()).
+    #
+    # A closed statement never changes, so with a cache they are only ever
+    # fetched once, and only the open one is fetched every time.
+    today = str(date.today())
+    cached = {}
+    statuses = {}
+    listings = {}
+    for s in statementends:
+        if cache and s < today:
+            transactions = cache.get(statement_cache_key(token, s))
+            if transactions is not None:
+                cached[s] = transactions
+                continue
+        statuses[s] = pending and s >= today and ['pending', 'posted'] or ['posted']
+        for status in statuses[s]:
+            listings[(s, status)] = {'pages': {}, 'total': None, 'npages': None}
+    errors = {}
+    futures = {}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        def _submit(key, offset):
+            futures[executor.submit(fetch_page, sess, token, key[0], key[1], offset)] = (key, offset)
+
+        def _done(s):
+            return all(listings[(s, status)]['npages'] == len(listings[(s, status)]['pages']) for status in statuses[s])
+
+        for key in listings:
+            _submit(key, 0)
+        try:
+            for s in statementends:
+                if s in cached:
+                    yield s, cached.pop(s), None
+                    continue
+                while s not in errors and not _done(s):
+                    (done, notdone) = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for f in done:
+                        (key, offset) = futures.pop(f)
+                        listing = listings[key]
+                        try:
+                            (transactions, total) = f.result()
+                        except Exception as e:
+                            errors.setdefault(key[0], e)
+                            continue
+                        listing['pages'][offset] = transactions
+                        if offset == 0 and total is not None:
+                            listing['total'] = total
+                            listing['npages'] = max(-(-total // pagesize), 1)
+                            for o in range(pagesize, total, pagesize):
+                                _submit(key, o)
+                        elif listing['total'] is None:
+                            if len(transactions) >= pagesize:
+                                _submit(key, offset + pagesize)
+                            else:
+                                listing['npages'] = offset // pagesize + 1
+                if s in errors:
+                    yield s, None, errors[s]
+                    continue
+                try:
+                    transactions = merge_pages([(status, listings.pop((s, status))) for status in statuses[s]])
+                except Exception as e:
+                    yield s, None, e
+                    continue
+                if cache and s < today:
+                    cache.put(statement_cache_key(token, s), transactions)
+                yield s, transactions, None
+        finally:
+            # If the caller stops early, don't bother fetching what's not started yet
+            for f in futures:
+                f.cancel()
+
+
+def transaction_id(t):
+    # reference_id is the native id of a transaction. Pending transactions don't
+    # have one yet, so they go by their identifier, like Transaction.from_amex()
+    # does. If both are ever missing, identify the transaction by its contents.
+    return t.get('reference_id', None) or t.get('identifier', None) or json.dumps(t, sort_keys=True)
+
+
+_otp_module = 'div[data-module-name="identity-components-otp"]'
+
+# True once the login either needs 2FA or is done, in which case we end up on
+# the dashboard.
+_login_progressed_js = """
+return !!document.querySelector(arguments[0]) || document.location.href.indexOf('dashboard') >= 0;
+"""
+
+
+class LoginFailed(Exception):
+    pass
+
+
+def browser_login(args, password, pool=None):
+    # Log in using chrome, and return the cookies of the logged in session.
+    # Selenium is only imported here, so runs with a cached session don't wait for it.
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as cond
+    from selenium.common.exceptions import TimeoutException
+
+    pool = pool or browserpool.BrowserPool.from_args(args, refill=False)
+    with metrics.phase('login'), pool.lease() as driver:
+        driver.implicitly_wait(5)
+
+        status("Getting login form...")
+        driver.get(loginurl)
+        # Click on the cookie button
+        status("Accepting cookies...")
+        try:
+            driver.find_element_by_css_selector('button[data-testid="granular-banner-button-accept-all"]').click()
+        except Exception:
+            print("Clicking cookie accept failed")
+            # But don't care if it fails
+            pass
+
+        status("Logging in...")
+        # Log in
+        driver.find_element_by_id('eliloUserID').clear()
+        driver.find_element_by_id('eliloUserID').send_keys(args.username)
+        driver.find_element_by_id('eliloPassword').clear()
+        driver.find_element_by_id('eliloPassword').send_keys(password)
+        driver.find_element_by_id('loginSubmit').click()
+
+        # Wait for some random background javascript
+        status("Waiting for cookies or 2FA...")
+        try:
+            WebDriverWait(driver, args.timeout).until(lambda d: d.execute_script(_login_progressed_js, _otp_module))
+        except TimeoutException as e:
+            # Most likely a wrong password
+            raise LoginFailed("Login did not reach 2FA or the dashboard") from e
+
+        # Is 2FA here?
+        if driver.execute_script("return !!document.querySelector(arguments[0]);", _otp_module):
+            with metrics.phase('2fa'):
+                try:
+                    # Select the first available 2fa
+                    try:
+                        driver.find_element_by_css_selector(_otp_module + ' input[type=radio]').click()
+                    except Exception:
+                        status("Exception trying to click radio button, trying the label instead")
+                        WebDriverWait(driver, args.timeout).until(cond.element_to_be_clickable((By.CSS_SELECTOR, _otp_module + ' label'))).click()
+
+                    # Then find and click the button
+                    driver.find_element_by_css_selector(_otp_module + ' button[type="submit"]').click()
+
+                    codefield = driver.find_element_by_id('question-input')
+                    code = slots.getpass('One time password: ')
+                    codefield.send_keys(code)
+
+                    driver.find_element_by_css_selector('div[data-module-name="identity-components-question"] button[type="submit"]').click()
+
+                    WebDriverWait(driver, args.timeout).until(cond.element_to_be_clickable(
+                        (By.CSS_SELECTOR, 'div[data-module-name="identity-two-step-verification"] button[type="submit"]'),
+                    )).click()
+                    status("2FA completed")
+                except Exception as e:
+                    raise LoginFailed("2FA failed: {}: {}".format(type(e).__name__, e)) from e
+        else:
+            status("No 2FA. Trying to continue.")
+
+        # The session cookies are all there once we have reached the dashboard
+        try:
+            WebDriverWait(driver, args.timeout).until(cond.url_contains('dashboard'))
+        except TimeoutException:
+            status("Did not reach the dashboard after login. Trying to continue.")
+
+        cookies = driver.get_cookies()
+        status("Copying {} cookies".format(len(cookies)))
+        return cookies
+
+
+def set_session_cookies(sess, cookies):
+    for c in cookies:
+        sess.cookies.set_cookie(requests.cookies.create_cookie(c['name'], c['value']))
+
+
+def _session_cache_key(password, salt):
+    # cryptography is only needed when the session cache is used, so don't require
+    # it for anything else.
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+    kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=200000)
+    return base64.urlsafe_b64encode(kdf.derive(password.encode('utf8')))
+
+
+def load_session_cache(filename, password):
+    # Returns the list of cached cookies, or None if there is no usable cache. A cache
+    # that can't be decrypted (e.g. because the password changed) is just ignored.
+    from cryptography.fernet import Fernet, InvalidToken
+
+    try:
+        with open(filename, 'rb') as f:
+            salt = f.read(16)
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    try:
+        return json.loads(Fernet(_session_cache_key(password, salt)).decrypt(data).decode('utf8'))
+    except (InvalidToken, ValueError):
+        status("Could not decrypt session cache, ignoring it")
+        return None
+
+
+def save_session_cache(filename, password, cookies):
+    from cryptography.fernet import Fernet
+
+    salt = os.urandom(16)
+    data = Fernet(_session_cache_key(password, salt)).encrypt(json.dumps(cookies).encode('utf8'))
+    # The file holds live session cookies, so never make it readable by others.
+    fd = os.open(filename + '.tmp', os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(salt)
+        f.write(data)
+    os.replace(filename + '.tmp', filename)
+
+
+def check_session(sess, token):
+    # One cheap call to see if the session is still logged in. When it has expired
+    # we get redirected to the login page instead of getting the data.
+    if token:
+        r = sess.get(
+            baseurl + '/api/servicing/v1/financials/statement_periods',
+            headers={'account_token': token},
+            allow_redirects=False,
+        )
+    else:
+        r = sess.get(baseurl + '/dashboard', allow_redirects=False)
+    return r.status_code == 200
+
+
+def get_statement_periods(sess, token, cache=None):
+    # The list only changes when the open statement closes, so a cached one is
+    # good for as long as a statement in it is still open.
+    key = 'amex/{}/statement_periods'.format(token)
+    statements = cache and cache.get(key)
+    if statements and max(s['statement_end_date'] for s in statements) >= str(date.today()):
+        return statements
+    r = sess.get(
+        baseurl + '/api/servicing/v1/financials/statement_periods',
+        headers={'account_token': token}
+    )
+    r.raise_for_status()
+    statements = r.json()
+    if cache:
+        cache.put(key, statements)
+    return statements
+
+
+def crawl_card(sess, token, args, writer, cache=None):
+    # Fetch and write the transactions of one card, returning the number of
+    # statements that failed. We start by getting the statement periods.
+    status('Getting list of statements')
+    with metrics.phase('navigation'):
+        statements = get_statement_periods(sess, token, cache)
+
+    # Statements are returned newest first, so just fetch as many as we need from
+    # the top of the list, in parallel.
+    statementends = [s['statement_end_date'] for s in statements[:args.months]]
+    store = args.store and txstore.TransactionStore(args.store, 'amex', token)
+    today = str(date.today())
+    failed = 0
+    # Ids of everything in the open statements, to find pending transactions that are gone
+    seen = set()
+    opened = False
+    statementiter = fetch_statements(sess, token, statementends, args.workers, args.pending, cache)
+    while True:
+        with metrics.phase('extraction'):
+            (statementend, transactions, e) = next(statementiter, (None, None, None))
+        if statementend is None:
+            break
+        if e:
+            status("Failed to fetch statement ending on {}: {}".format(statementend, e))
+            failed += 1
+            continue
+        status("Loaded {} transactions from statement ending on {}".format(len(transactions), statementend))
+        metrics.add_rows(len(transactions))
+        if store:
+            rows = [(transaction_id(t), t) for t in transactions]
+            # A closed statement never changes, so once we reach one that we already
+            # have everything from, there is nothing new further back.
+            if args.since_last_sync and statementend < today and store.all_known(rows):
+                status("Statement ending on {} already synced, stopping".format(statementend))
+                break
+            changed = store.update(rows)
+            if statementend >= today:
+                seen.update(txid for txid, t in rows)
+                opened = True
+            if args.since_last_sync:
+                status("{} new or changed transactions".format(len(changed)))
+                transactions = changed
+        if args.pending:
+            tag_status(transactions, 'posted')
+        with metrics.phase('output'):
+            for t in transactions:
+                writer.write(t)
+            writer.flush()
+    statementiter.close()
+    if store:
+        # A pending transaction gets a reference_id when it's posted, and is then
+        # stored again under that, so the pending one that is left is stale
+        if args.pending and opened and not failed:
+            stale = [txid for txid, t in store.rows() if t.get('status', None) == 'pending' and txid not in seen]
+            if stale:
+                status("Removing {} pending transactions that are gone".format(len(stale)))
+                store.remove(stale)
+        store.close()
+    return failed
+
+
+def set_baseurl(url):
+    global baseurl, loginurl
+    baseurl = url.rstrip('/')
+    loginurl = baseurl + '/sv-se/account/login?inav=iNavLnkLog'
+
+
+def login(sess, args, password, pool=None):
+    # Log the session in, reusing the cached session if it's still valid and
+    # logging in with the browser (from pool, if given) if not
+    cookies = None
+    if args.sessioncache:
+        cookies = load_session_cache(args.sessioncache, password)
+        if cookies:
+            set_session_cookies(sess, cookies)
+            with metrics.phase('login'):
+                valid = check_session(sess, args.token)
+            if valid:
+                status("Reusing cached session")
+            else:
+                status("Cached session has expired, logging in again")
+                sess.cookies.clear()
+                cookies = None
+
+    if not cookies:
+        cookies = browser_login(args, password, pool)
+        set_session_cookies(sess, cookies)
+        if args.sessioncache:
+            save_session_cache(args.sessioncache, password, cookies)
+
+
+def main(args):
+    metrics.setup('amex', args)
+
+    if args.baseurl:
+        set_baseurl(args.baseurl)
+
+    if args.since_last_sync and not args.store:
+        print("--since-last-sync requires --store", file=sys.stderr)
+        sys.exit(1)
+
+    # Without a session cache we know we need the browser, so let chrome start
+    # while the user types the password. Under batch, only once we get a slot.
+    # Everything from here until we're logged in is in the try/finally, so a
+    # pre-started chrome is never left running.
+    pool = None
+    try:
+        if not args.sessioncache:
+            pool = browserpool.BrowserPool.from_args(args, refill=False, prestart=not slots.limited('chrome'))
+
+        if args.password:
+            password = args.password
+        else:
+            password = slots.getpass('Amex password for {0}: '.format(args.username))
+        if not password:
+            status("No password given.")
+            sys.exit(1)
+
+        sess = create_session(args.workers)
+        try:
+            login(sess, args, password, pool)
+        except LoginFailed as e:
+            status(e)
+            sys.exit(1)
+    finally:
+        if pool:
+            pool.close()
+
+    if args.listtokens or not args.token:
+        status("Fetching dashboard...")
+        with metrics.phase('navigation'):
+            cards = get_cards(sess)
+        if args.listtokens:
+            print("")
+            for c in cards:
+                print("Card ending in -{}: token {}".format(c['display_account_number'], c['token']))
+            print("")
+            if cards:
+                print("{} cards found.".format(len(cards)))
+            else:
+                print("No cards were found.")
+            sys.exit(0)
+        if not cards:
+            status("No cards were found.")
+            sys.exit(1)
+        tokens = [c['token'] for c in cards]
+        status("Found {} cards".format(len(tokens)))
+    else:
+        tokens = [args.token]
+
+    # Each statement is written out as soon as it has been loaded
+    columns = get_columns(args)
+    if args.pending and columns is csvcolumns:
+        # Tell pending and posted transactions apart in the default columns
+        columns = csvcolumns + ['status']
+    writer = outputwriter.get_writer(
+        args.format,
+        args.output,
+        columns,
+        tocsv=compile_columns(columns),
+        pretty=args.jsonpretty,
+        # Rows are written while crawling the card of token
+        normalize=lambda t: transaction.Transaction.from_amex(t, token),
+    )
+    cache = args.responsecache and responsecache.ResponseCache(args.responsecache)
+    failed = 0
+    with slots.slot('http'):
+        for token in tokens:
+            failed += crawl_card(sess, token, args, writer, cache)
+    if cache:
+        if args.cachemaxsize is not None or args.cachemaxage is not None:
+            dropped = cache.evict(
+                None if args.cachemaxsize is None else args.cachemaxsize * 1024 * 1024,
+                None if args.cachemaxage is None else args.cachemaxage * 86400,
+            )
+            status("Evicted {} responses from the cache".format(dropped))
+        cache.close()
+    writer.close()
+    metrics.report()
+
+    if failed:
+        status("{} statements could not be fetched.".format(failed))
+        sys.exit(1)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+#
+# Run the crawlers for many accounts in parallel, from a config file with one
+# section per account:
+#
+#   [amex-personal]
+#   crawler = amex
+#   username = someone
+#   token = ABCDEF123
+#   months = 3
+#   since-last-sync
+#
+#   [seb-eurobonus]
+#   crawler = seb
+#   personnr = 197001011234
+#   cardtype = saseurobonus
+#
+# The crawler and its positional arguments are given by name, every other key
+# becomes an option for the crawler (--key value, or just --key without a
+# value), and extra raw arguments can be given in args. Keys in [DEFAULT] apply
+# to all accounts.
+#
+# Each account runs as its own cardcrawler process, writing its output and log to
+# files in the output directory. How many browsers and http crawls run at the
+# same time, across all processes, is limited by the slots module, and only one
+# account at a time gets to ask the user for passwords or 2FA.
+#
+
+import concurrent.futures
+import configparser
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+
+# Names of the positional arguments of each crawler
+crawlers = {
+    'amex': ['username'],
+    'seb': ['personnr', 'cardtype'],
+    'revolut': ['phone'],
+}
+
+_reserved = ('crawler', 'args')
+
+
+def status(msg):
+    print(msg, file=sys.stderr)
+
+
+def read_accounts(filename):
+    # Returns a list of (name, crawler, argument list)
+    config = configparser.ConfigParser(allow_no_value=True, interpolation=None)
+    with open(filename) as f:
+        config.read_file(f)
+    accounts = []
+    for name in config.sections():
+        section = config[name]
+        crawler = section.get('crawler', None)
+        if crawler not in crawlers:
+            raise ValueError("Account {}: unknown crawler {}, should be one of {}".format(name, crawler, ', '.join(crawlers)))
+        positional = crawlers[crawler]
+        arguments = []
+        for key in positional:
+            if not section.get(key, None):
+                raise ValueError("Account {}: {} is required for {}".format(name, key, crawler))
+            arguments.append(section[key])
+        for key, value in section.items():
+            if key in _reserved or key in positional:
+                continue
+            arguments.append('--{}'.format(key))
+            if value is not None:
+                arguments.append(value)
+        arguments.extend(shlex.split(section.get('args', None) or ''))
+        accounts.append((name, crawler, arguments))
+    return accounts
+
+
+def run_account(name, crawler, arguments, args, env):
+    # Run the crawler for one account, and return (exit code, seconds)
+    env = dict(env, CARDCRAWLER_ACCOUNT=name)
+    output = os.path.join(args.outputdir, '{}.out'.format(name))
+    log = os.path.join(args.outputdir, '{}.log'.format(name))
+    status("Starting {}".format(name))
+    start = time.time()
+    with open(output, 'w') as out, open(log, 'w') as err:
+        try:
+            returncode = subprocess.call([sys.executable, '-m', 'cardcrawler', crawler] + arguments, stdout=out, stderr=err, env=env)
+        except OSError as e:
+            print("Failed to start crawler: {}".format(e), file=err)
+            returncode = -1
+    elapsed = time.time() - start
+    status("Finished {} in {:.1f}s{}".format(name, elapsed, returncode and ", failed with exit code {}".format(returncode) or ""))
+    return returncode, elapsed
+
+
+def main(args):
+    try:
+        accounts = read_accounts(args.config)
+    except (OSError, ValueError, configparser.Error) as e:
+        status("Failed to read config: {}".format(e))
+        sys.exit(1)
+    if args.accounts:
+        unknown = set(args.accounts) - set(a[0] for a in accounts)
+        if unknown:
+            status("Unknown accounts: {}".format(', '.join(sorted(unknown))))
+            sys.exit(1)
+        accounts = [a for a in accounts if a[0] in args.accounts]
+
+    os.makedirs(args.outputdir, exist_ok=True)
+    lockdir = tempfile.mkdtemp(prefix='cardcrawler-slots-')
+    # The crawlers run from the same cardcrawler package as we do, installed or not
+    package = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    pythonpath = os.environ.get('PYTHONPATH', None)
+    env = dict(
+        os.environ,
+        PYTHONPATH=pythonpath and package + os.pathsep + pythonpath or package,
+        CARDCRAWLER_SLOTS=lockdir,
+        CARDCRAWLER_SLOTS_CHROME=str(args.browsers),
+        CARDCRAWLER_SLOTS_HTTP=str(args.http),
+    )
+
+    results = {}
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(args.jobs, 1)) as executor:
+            futures = {executor.submit(run_account, name, crawler, arguments, args, env): name for name, crawler, arguments in accounts}
+            for f in concurrent.futures.as_completed(futures):
+                results[futures[f]] = f.result()
+    finally:
+        shutil.rmtree(lockdir, ignore_errors=True)
+
+    # Summary, in the order of the config
+    failed = [name for name, crawler, arguments in accounts if results[name][0]]
+    print("", file=sys.stderr)
+    for name, crawler, arguments in accounts:
+        (returncode, elapsed) = results[name]
+        print("  {:<24} {:<8} {:>8.1f}s  {}".format(
+            name,
+            crawler,
+            elapsed,
+            returncode and "FAILED ({}), see {}".format(returncode, os.path.join(args.outputdir, name + '.log')) or "ok",
+        ), file=sys.stderr)
+    print("{} accounts crawled, {} failed.".format(len(accounts), len(failed)), file=sys.stderr)
+    sys.exit(failed and 1 or 0)
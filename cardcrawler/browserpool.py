@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+#
+# Pool of pre-started chrome browsers, shared by the crawlers.
+#
+# Every browser runs with its own temporary profile, and is thrown away (and its
+# profile removed) when the lease ends, so no login session is ever shared
+# between two leases. Browsers can be pre-started when the pool is created, so
+# chrome starts while we do other things (like asking for a password), and with
+# refill enabled a replacement is started in the background as soon as a browser
+# is returned, so the next lease doesn't have to wait for chrome to start either.
+# Pre-started browsers are health checked before they are leased out, and with
+# maxlease a browser that has been leased for too long is recycled.
+#
+# Unless disabled, browsers also run with a lightweight profile that doesn't load
+# images, fonts, media or known trackers, since none of it is needed to crawl.
+# With stats, how much each browser loaded and blocked is counted from chrome's
+# performance log. Chrome keeps that log until it's read, so it's only enabled
+# when asked for.
+#
+
+import contextlib
+import json
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+
+from cardcrawler import metrics
+from cardcrawler import slots
+
+
+# Patterns for Network.setBlockedURLs, where * matches anything
+blocked_urls = [
+    # Static assets
+    '*.png*', '*.jpg*', '*.jpeg*', '*.gif*', '*.webp*', '*.svg*', '*.ico*',
+    '*.woff*', '*.ttf*', '*.otf*', '*.eot*',
+    '*.mp4*', '*.webm*',
+    # Analytics and trackers
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+    '*facebook.net*', '*facebook.com/tr*', '*hotjar.com*', '*omtrdc.net*',
+    '*demdex.net*', '*adobedtm.com*', '*linkedin.com*', '*bing.com*',
+    '*quantserve.com*', '*optimizely.com*',
+    # Third party cookie banners
+    '*cookielaw.org*', '*onetrust.com*', '*cookiebot.com*', '*trustarc.com*',
+]
+
+# Arguments that keep chrome from doing things in the background that we don't need
+lightweight_arguments = [
+    '--blink-settings=imagesEnabled=false',
+    '--disable-background-networking',
+    '--disable-default-apps',
+    '--disable-extensions',
+    '--disable-sync',
+    '--mute-audio',
+    '--no-first-run',
+]
+
+
+def add_arguments(parser):
+    parser.add_argument('--debug', action='store_true', help='Enable debug = view the chrome window')
+    parser.add_argument('--chrome', type=str, default='chrome', help='Path to chrome browser to use')
+    parser.add_argument('--chromedriver', type=str, default='chromedriver', help='Path to chromedriver binary to use')
+    parser.add_argument('--nosandbox', action='store_true', help='Disable chrome sandbox (used in docker)')
+    parser.add_argument('--noblock', action='store_true', help='Load images, fonts and trackers like a normal browser')
+    parser.add_argument('--timeout', type=float, default=30, help='Seconds to wait for pages and elements to become ready')
+    parser.add_argument('--usertimeout', type=float, default=120, help='Seconds to wait for the user to approve a login')
+    parser.add_argument('--browserstats', action='store_true', help='Count the requests and bytes the browser loaded and blocked')
+    parser.add_argument('--maxlease', type=float, help='Recycle a browser that has been in use for more than this many seconds, since it has most likely hung')
+
+
+def read_network_log(driver):
+    # Read the chrome performance log, and return the devtools messages in it.
+    # Since reading the log empties it, anybody who needs the log should read it
+    # through here, so the network statistics still add up.
+    messages = [json.loads(entry['message'])['message'] for entry in driver.get_log('performance')]
+    stats = getattr(driver, 'cardcrawler_network', None)
+    if stats is not None:
+        for msg in messages:
+            if msg['method'] == 'Network.requestWillBeSent':
+                stats['requests'] += 1
+            elif msg['method'] == 'Network.loadingFinished':
+                stats['bytes'] += int(msg['params'].get('encodedDataLength', 0))
+            elif msg['method'] == 'Network.loadingFailed' and msg['params'].get('blockedReason', None):
+                stats['blocked'] += 1
+    return messages
+
+
+def _kill_profile_processes(profile):
+    # Kill anything still running with this profile, in case chrome was left
+    # behind by a chromedriver that died or hung. Only works where there is a /proc.
+    if not os.path.isdir('/proc'):
+        return
+    marker = '--user-data-dir={}'.format(profile).encode('utf8')
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            with open('/proc/{}/cmdline'.format(pid), 'rb') as f:
+                if marker in f.read().split(b'\0'):
+                    os.kill(int(pid), signal.SIGKILL)
+        except (OSError, IOError):
+            pass
+
+
+class Browser(object):
+    def __init__(self, driver, profile):
+        self.driver = driver
+        self.profile = profile
+        self.started = time.time()
+        self.leased = None
+
+
+class BrowserPool(object):
+    def __init__(self, chrome, chromedriver, size=1, headless=True, nosandbox=False, capabilities=None,
+                 refill=True, maxlease=None, healthtimeout=10, lightweight=True, prestart=None, stats=False):
+        self.chrome = chrome
+        self.chromedriver = chromedriver
+        self.size = size
+        self.headless = headless
+        self.nosandbox = nosandbox
+        self.capabilities = dict(capabilities or {})
+        self.lightweight = lightweight
+        self.stats = stats
+        if stats:
+            # Needed to count what was loaded and blocked
+            self.capabilities['goog:loggingPrefs'] = {'performance': 'ALL'}
+        self.refill = refill
+        self.maxlease = maxlease
+        self.healthtimeout = healthtimeout
+
+        # size bounds both the number of warm browsers and how many can be leased
+        # at the same time.
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        # Notified whenever a pre-started browser is ready (or failed to start)
+        self._started = threading.Condition(self._lock)
+        self._idle = []
+        self._leased = []
+        self._starting = 0
+        self._closed = False
+
+        if refill if prestart is None else prestart:
+            for i in range(size):
+                self._prestart()
+        if maxlease:
+            threading.Thread(target=self._watchdog, daemon=True).start()
+
+    @classmethod
+    def from_args(cls, args, **kwargs):
+        kwargs.setdefault('headless', not args.debug)
+        kwargs.setdefault('lightweight', not args.noblock)
+        kwargs.setdefault('maxlease', args.maxlease)
+        kwargs.setdefault('stats', args.browserstats)
+        return cls(args.chrome, args.chromedriver, nosandbox=args.nosandbox, **kwargs)
+
+    def _start(self):
+        # Selenium is imported the first time a browser is started, so that
+        # whoever never needs one doesn't have to wait for it
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+
+        profile = tempfile.mkdtemp(prefix='cardcrawler-chrome-')
+        options = Options()
+        options.binary_location = self.chrome
+        options.add_argument('--user-data-dir={}'.format(profile))
+        if self.headless:
+            options.add_argument('--headless')
+        if self.nosandbox:
+            options.add_argument('--no-sandbox')
+        if self.lightweight:
+            for a in lightweight_arguments:
+                options.add_argument(a)
+            options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+        driver = None
+        try:
+            driver = webdriver.Chrome(executable_path=self.chromedriver, options=options,
+                                      desired_capabilities=dict(self.capabilities) or None)
+            metrics.instrument_driver(driver)
+            if self.stats:
+                driver.cardcrawler_network = {'requests': 0, 'blocked': 0, 'bytes': 0}
+            if self.lightweight:
+                driver.execute_cdp_cmd('Network.enable', {})
+                driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': blocked_urls})
+        except Exception:
+            if driver:
+                driver.quit()
+            _kill_profile_processes(profile)
+            shutil.rmtree(profile, ignore_errors=True)
+            raise
+        return Browser(driver, profile)
+
+    def _report(self, b):
+        # Print how much was loaded and how much we avoided loading
+        try:
+            read_network_log(b.driver)
+        except Exception:
+            return
+        stats = b.driver.cardcrawler_network
+        metrics.run.browser_network(stats)
+        print("Browser loaded {} requests ({} kB), blocked {} requests".format(
+            stats['requests'] - stats['blocked'],
+            stats['bytes'] // 1024,
+            stats['blocked'],
+        ), file=sys.stderr)
+
+    def _prestart(self):
+        with self._lock:
+            if self._closed or len(self._idle) + self._starting >= self.size:
+                return
+            self._starting += 1
+
+        def _run():
+            try:
+                b = self._start()
+            except Exception as e:
+                print("Failed to pre-start chrome: {}".format(e), file=sys.stderr)
+                b = None
+            with self._lock:
+                self._starting -= 1
+                if b and not self._closed:
+                    self._idle.append(b)
+                    b = None
+                self._started.notify()
+            if b:
+                self._destroy(b)
+        threading.Thread(target=_run, daemon=True).start()
+
+    def _destroy(self, b):
+        try:
+            b.driver.quit()
+        except Exception:
+            pass
+        _kill_profile_processes(b.profile)
+        shutil.rmtree(b.profile, ignore_errors=True)
+
+    def _healthy(self, b):
+        # Run a trivial script in the browser, in a thread so a hung chrome can't
+        # hang us as well.
+        result = []
+
+        def _check():
+            try:
+                result.append(b.driver.execute_script('return 1') == 1)
+            except Exception:
+                result.append(False)
+        t = threading.Thread(target=_check, daemon=True)
+        t.start()
+        t.join(self.healthtimeout)
+        return bool(result and result[0])
+
+    def _watchdog(self):
+        # Recycle browsers that have been leased for too long, since they have most
+        # likely been leaked or are hung. Whoever has the lease will get errors from
+        # webdriver from here on.
+        while not self._closed:
+            time.sleep(min(self.maxlease, 30))
+            now = time.time()
+            with self._lock:
+                expired = [b for b in self._leased if now - b.leased > self.maxlease]
+                for b in expired:
+                    self._leased.remove(b)
+            for b in expired:
+                print("Recycling chrome leased for more than {} seconds".format(self.maxlease), file=sys.stderr)
+                self._destroy(b)
+
+    def _get(self):
+        while True:
+            with self._lock:
+                # A browser that is already starting will be ready sooner than a new one
+                while not self._idle and self._starting and not self._closed:
+                    self._started.wait()
+                b = self._idle and self._idle.pop(0) or None
+            if not b:
+                return self._start()
+            if self._healthy(b):
+                return b
+            print("Discarding unhealthy pre-started chrome", file=sys.stderr)
+            self._destroy(b)
+
+    @contextlib.contextmanager
+    def lease(self):
+        # Other crawler processes may be limited to a number of browsers in total
+        with slots.slot('chrome'):
+            with self._lease() as driver:
+                yield driver
+
+    @contextlib.contextmanager
+    def _lease(self):
+        self._slots.acquire()
+        try:
+            b = self._get()
+            b.leased = time.time()
+            with self._lock:
+                self._leased.append(b)
+            try:
+                yield b.driver
+            finally:
+                # Make sure we always shut down the chrome
+                with self._lock:
+                    mine = b in self._leased
+                    if mine:
+                        self._leased.remove(b)
+                if mine:
+                    if self.stats:
+                        self._report(b)
+                    self._destroy(b)
+                if self.refill:
+                    self._prestart()
+        finally:
+            self._slots.release()
+
+    def leased(self, driver):
+        # False once the lease of this driver has ended, or it has been recycled
+        with self._lock:
+            return any(b.driver is driver for b in self._leased)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            browsers = self._idle + self._leased
+            self._idle = []
+            self._leased = []
+        for b in browsers:
+            self._destroy(b)
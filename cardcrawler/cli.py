@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+#
+# The cardcrawler command, with a subcommand for each bank and a few more:
+#
+#   cardcrawler amex USERNAME ...
+#   cardcrawler seb PERSONNR CARDTYPE ...
+#   cardcrawler revolut PHONE ...
+#   cardcrawler export STORE ...
+#   cardcrawler batch CONFIG ...
+#   cardcrawler daemon CONFIG ...
+#
+# All arguments are declared here, so that --help and argument errors don't
+# have to import any of the crawlers. The module of a subcommand is only
+# imported once its arguments have been parsed, and selenium only once a
+# browser is started, so paths that never need a browser (like an amex run with
+# a cached session, or an export from the store) start quickly.
+#
+
+import argparse
+import datetime
+import importlib
+import sys
+
+from cardcrawler import browserpool
+from cardcrawler import metrics
+from cardcrawler import outputwriter
+
+
+# Same as the keys of seb.cardtypes, which we don't want to import for --help
+seb_cardtypes = ('saseurobonus', 'nordicchoice')
+
+
+def add_output_arguments(parser):
+    parser.add_argument('--format', choices=outputwriter.formats, default='csv', help='Output format')
+    parser.add_argument('--output', type=argparse.FileType('w', encoding='UTF-8'), default='-', help='Write output to file (- for stdout)')
+
+
+def add_crawler_arguments(parser, site):
+    # Arguments that every bank crawler has
+    add_output_arguments(parser)
+    browserpool.add_arguments(parser)
+    metrics.add_arguments(parser)
+    parser.add_argument('--baseurl', type=str, help='Use this site instead of {} (e.g. a local stand-in)'.format(site))
+    parser.add_argument('--store', type=str, help='Local database to store transactions in')
+    parser.add_argument('--since-last-sync', action='store_true', help='Only output new or changed transactions since the last run (requires --store)')
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(prog='cardcrawler', description="Credit card transaction crawlers")
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+    subparsers.required = True
+
+    p = subparsers.add_parser('amex', help='Amex transaction crawler', description="Amex transaction crawler")
+    p.add_argument('username', type=str, help='Amex web username')
+    p.add_argument('--password', type=str, help='Amex web password')
+    p.add_argument('--token', type=str, help='Amex token number (default is all cards on the account)')
+    p.add_argument('--months', type=int, default=2, help='Number of months to fetch')
+    p.add_argument('--workers', type=int, default=4, help='Number of pages of statements to fetch in parallel')
+    p.add_argument('--pending', action='store_true', help='Also fetch pending transactions, and add their status to the output')
+    p.add_argument('--columns', type=str, help='Comma separated list of csv columns, start with + to add to the default ones')
+    p.add_argument('--columnsfile', type=str, help='File with one csv column per line, start with + to add to the default ones')
+    p.add_argument('--jsonpretty', action='store_true', help='Pretty-print json output')
+    add_crawler_arguments(p, 'americanexpress.com, including for login,')
+    p.add_argument('--responsecache', type=str, help='Directory to cache closed statements in, so they are only fetched once')
+    p.add_argument('--cachemaxsize', type=float, help='Evict the least recently used responses when the cache is bigger than this many MB')
+    p.add_argument('--cachemaxage', type=float, help='Evict responses that have not been used for this many days')
+    p.add_argument('--sessioncache', type=str, help='Encrypted file to cache the login session in between runs')
+    p.add_argument('--listtokens', action='store_true', help='List available accounts/tokens')
+
+    p = subparsers.add_parser('seb', help='SEB cards transaction crawler', description="SEB cards transaction crawler")
+    p.add_argument('personnr', type=str, help='Personnr')
+    p.add_argument('cardtype', choices=seb_cardtypes, help='Type of card')
+    p.add_argument('--months', type=int, default=2, help='Number of months to fetch')
+    add_crawler_arguments(p, 'secure.sebkort.com')
+
+    p = subparsers.add_parser('revolut', help='Revolutcard transaction crawler', description="Revolutcard transaction crawler")
+    p.add_argument('phone', type=str, help='Revolut account phonenumber')
+    p.add_argument('--password', type=str, help='Revolut web password')
+    p.add_argument('--days', type=int, default=60, help='Number of days to fetch')
+    p.add_argument('--since', type=lambda d: datetime.datetime.strptime(d, '%Y-%m-%d').date(), help='Fetch transactions since this date (YYYY-MM-DD), overrides --days')
+    p.add_argument('--api', action='store_true', help='Read transactions from the json api of the web app instead of the rendered page')
+    add_crawler_arguments(p, 'app.revolut.com')
+
+    p = subparsers.add_parser('export', help='Write out transactions from the local store', description="Write out transactions from the local store, of all banks in the same columns")
+    p.add_argument('store', type=str, help='Local database the crawlers stored transactions in')
+    p.add_argument('--source', choices=('amex', 'seb', 'revolut'), help='Only export transactions from this bank')
+    p.add_argument('--account', type=str, help='Only export transactions of this account (amex token, seb personnr/cardtype or revolut phone)')
+    p.add_argument('--after', type=int, default=0, help='Only export transactions stored or changed after this sequence number')
+    add_output_arguments(p)
+
+    p = subparsers.add_parser('batch', help='Run crawlers for many accounts in parallel', description="Run crawlers for many accounts in parallel")
+    p.add_argument('config', type=str, help='Config file with one section per account')
+    p.add_argument('--outputdir', type=str, default='.', help='Directory to write output (<account>.out) and logs (<account>.log) to')
+    p.add_argument('--jobs', type=int, default=4, help='Number of accounts to crawl at the same time')
+    p.add_argument('--browsers', type=int, default=2, help='Number of chrome browsers to run at the same time')
+    p.add_argument('--http', type=int, default=4, help='Number of accounts to fetch over http at the same time')
+    p.add_argument('accounts', type=str, nargs='*', help='Only crawl these accounts (default all)')
+
+    p = subparsers.add_parser('daemon', help='Keep accounts logged in and serve new transactions from a local api',
+                              description="Keep accounts logged in, crawl them regularly and serve new transactions from a local api")
+    p.add_argument('config', type=str, help='Config file with one section per account, like for batch')
+    p.add_argument('--store', type=str, required=True, help='Local database to store transactions in')
+    p.add_argument('--interval', type=float, default=300, help='Seconds between crawls of each account')
+    p.add_argument('--listen', type=str, default='127.0.0.1:8741', help='Address and port to serve the api on, with no access control, so every local user can read all transactions')
+    p.add_argument('--socket', type=str, help='Serve the api on this unix socket instead, only accessible to the user running the daemon')
+    p.add_argument('--maxlease', type=float, default=12*3600, help='Seconds before a browser is recycled, and its account logs in again')
+    metrics.add_arguments(p)
+    p.add_argument('accounts', type=str, nargs='*', help='Only keep these accounts (default all)')
+
+    return parser
+
+
+def main(argv=None):
+    args = create_parser().parse_args(argv)
+    module = importlib.import_module('cardcrawler.' + args.command)
+    return module.main(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
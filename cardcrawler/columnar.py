@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+#
+# Compact columnar binary format for transactions, so millions of rows from many
+# cards can be merged and loaded without parsing csv.
+#
+# A file starts with a magic string and a json header with the columns and their
+# types, followed by blocks of up to blocksize rows. Each block is the number of
+# rows, and then every column as its own zlib compressed chunk:
+#
+#   str:     null flags, lengths in characters (uint32), then all strings after
+#            each other in utf8
+#   date:    null flags, proleptic ordinals (int32)
+#   decimal: null flags, scale (uint8), values * 10**scale (int64)
+#
+# All numbers are little endian. A block with zero rows ends the file.
+#
+# Running this file prints a columnar file as csv.
+#
+
+import array
+import csv
+import datetime
+import json
+import struct
+import sys
+import zlib
+from decimal import Decimal
+
+from cardcrawler.transaction import Transaction
+
+
+magic = b'CARDCOL1'
+
+_swap = sys.byteorder != 'little'
+
+
+def _pack(typecode, values):
+    a = array.array(typecode, values)
+    if _swap:
+        a.byteswap()
+    return a.tobytes()
+
+
+def _unpack(typecode, data):
+    a = array.array(typecode)
+    a.frombytes(data)
+    if _swap:
+        a.byteswap()
+    return a
+
+
+def _encode(kind, values):
+    nulls = bytes([v is None for v in values])
+    if kind == 'str':
+        strings = [v or '' for v in values]
+        return nulls + _pack('I', [len(v) for v in strings]) + ''.join(strings).encode('utf8')
+    elif kind == 'date':
+        return nulls + _pack('i', [v and v.toordinal() or 0 for v in values])
+    elif kind == 'decimal':
+        scale = max([0] + [-v.as_tuple().exponent for v in values if v is not None])
+        return nulls + bytes([scale]) + _pack('q', [v is not None and int(v.scaleb(scale)) or 0 for v in values])
+    raise ValueError("Unknown column type {}".format(kind))
+
+
+def _decode(kind, data, n):
+    nulls = data[:n]
+    data = data[n:]
+    if kind == 'str':
+        # Decoding all of them at once and then slicing is a lot faster than
+        # decoding them one at a time
+        lengths = _unpack('I', data[:4 * n])
+        blob = data[4 * n:].decode('utf8')
+        values = []
+        pos = 0
+        for l in lengths:
+            values.append(blob[pos:pos + l])
+            pos += l
+    elif kind == 'date':
+        values = [datetime.date.fromordinal(v) if v else None for v in _unpack('i', data)]
+    elif kind == 'decimal':
+        scale = -data[0]
+        values = [Decimal(v).scaleb(scale) for v in _unpack('q', data[1:])]
+    else:
+        raise ValueError("Unknown column type {}".format(kind))
+    return [None if null else v for null, v in zip(nulls, values)]
+
+
+class ColumnarWriter(object):
+    # Writes Transactions, or rows turned into Transactions by normalize
+    def __init__(self, f, normalize=None, blocksize=65536):
+        # Text files (like stdout) are written through their binary buffer
+        if hasattr(f, 'buffer'):
+            f.flush()
+            f = f.buffer
+        self.f = f
+        self.normalize = normalize
+        self.blocksize = blocksize
+        self.columns = list(Transaction.__slots__)
+        # Values are collected per column, so there is nothing to rearrange when
+        # the block is written
+        self.values = [[] for c in self.columns]
+        self.nrows = 0
+        header = json.dumps({'version': 1, 'columns': [[c, Transaction.types[c]] for c in self.columns]}).encode('utf8')
+        self.f.write(magic)
+        self.f.write(struct.pack('<I', len(header)))
+        self.f.write(header)
+
+    def _write_block(self):
+        self.f.write(struct.pack('<I', self.nrows))
+        for c, values in zip(self.columns, self.values):
+            chunk = zlib.compress(_encode(Transaction.types[c], values), 1)
+            self.f.write(struct.pack('<I', len(chunk)))
+            self.f.write(chunk)
+        self.values = [[] for c in self.columns]
+        self.nrows = 0
+
+    def write(self, row):
+        tx = self.normalize(row) if self.normalize else row
+        for values, v in zip(self.values, tx.values()):
+            values.append(v)
+        self.nrows += 1
+        if self.nrows >= self.blocksize:
+            self._write_block()
+
+    def flush(self):
+        # Blocks are only written when full, to keep them big
+        self.f.flush()
+
+    def close(self):
+        if self.nrows:
+            self._write_block()
+        self.f.write(struct.pack('<I', 0))
+        self.f.flush()
+
+
+class ColumnarReader(object):
+    def __init__(self, f):
+        self.f = getattr(f, 'buffer', f)
+        if self.f.read(len(magic)) != magic:
+            raise ValueError("Not a columnar transaction file")
+        (length,) = struct.unpack('<I', self.f.read(4))
+        header = json.loads(self.f.read(length).decode('utf8'))
+        self.columns = [c for c, kind in header['columns']]
+        self.types = dict(header['columns'])
+
+    def blocks(self):
+        # Yield each block as a dict of column name to list of values
+        while True:
+            data = self.f.read(4)
+            if len(data) < 4:
+                return
+            (n,) = struct.unpack('<I', data)
+            if n == 0:
+                return
+            block = {}
+            for c in self.columns:
+                (length,) = struct.unpack('<I', self.f.read(4))
+                block[c] = _decode(self.types[c], zlib.decompress(self.f.read(length)), n)
+            yield block
+
+    def __iter__(self):
+        # Yield every row as a Transaction (ignoring columns it doesn't have)
+        known = [c for c in self.columns if c in Transaction.__slots__]
+        for block in self.blocks():
+            if known == list(Transaction.__slots__):
+                for values in zip(*[block[c] for c in known]):
+                    yield Transaction(*values)
+            else:
+                for values in zip(*[block[c] for c in known]):
+                    yield Transaction(**dict(zip(known, values)))
+
+
+if __name__ == "__main__":
+    with open(sys.argv[1], 'rb') as f:
+        reader = ColumnarReader(f)
+        writer = csv.writer(sys.stdout)
+        writer.writerow(reader.columns)
+        for block in reader.blocks():
+            writer.writerows(zip(*[block[c] for c in reader.columns]))
@@ -0,0 +1,549 @@
+#!/usr/bin/env python3
+#
+# Keep logged in sessions to every account alive, crawl them every few minutes,
+# and answer queries for new transactions from a local api, so polling for new
+# transactions is a database query instead of a login.
+#
+# Accounts are read from the same config file as batch uses. Every account gets
+# a thread that logs in (one account at a time, since it may need a password or
+# 2FA from the user), and then every --interval seconds refreshes the session and
+# stores new or changed transactions in --store:
+#
+#  - amex: the same requests session is used for every crawl, which stops at the
+#    first closed statement that is already stored
+#  - seb: the browser stays logged in, and reloads the uninvoiced transactions
+#  - revolut: the browser stays logged in, and reloads the transaction list as
+#    far back as --days of the account
+#
+# An account whose session has expired logs in again. Older history is best
+# crawled once with the regular crawlers and the same --store.
+#
+# The browsers of all seb and revolut accounts come from one pool, which keeps a
+# fresh browser ready for the next login, and recycles browsers that have been in
+# use for more than --maxlease seconds (the account then just logs in again).
+#
+# The api is plain http, on --listen (localhost only by default) or on a unix
+# socket with --socket. There is no access control on --listen, so any local
+# user can read every transaction from it, while the socket is only accessible
+# to the user running the daemon. Use --socket on machines that are shared.
+#
+#   GET /transactions?after=SEQ     Transactions stored or changed after seq
+#       &since=TIME                 ... or at or after this time (YYYY-MM-DD[ HH:MM:SS])
+#       &source=amex&account=ID     ... only from this bank or account
+#       &wait=SECONDS               Wait this long for something new if there is nothing yet
+#   GET /status                     State of every account
+#   GET /metrics                    Metrics in prometheus text format
+#   POST /refresh?account=NAME      Crawl this (or without account, every) account now
+#
+# Transactions are returned as {"last": SEQ, "transactions": [...]}, in the same
+# columns as the export command plus their seq. Giving last as after to the next
+# request returns only what came after.
+#
+
+import configparser
+import contextlib
+import datetime
+import http.server
+import json
+import math
+import os
+import signal
+import socketserver
+import sys
+import threading
+import time
+import urllib.parse
+
+from cardcrawler import batch
+from cardcrawler import browserpool
+from cardcrawler import cli
+from cardcrawler import metrics
+from cardcrawler import slots
+from cardcrawler import transaction
+from cardcrawler import txstore
+
+
+# Longest a request may wait for new transactions
+maxwait = 300
+
+
+def status(msg):
+    print(msg, file=sys.stderr)
+
+
+class SessionExpired(Exception):
+    pass
+
+
+class Notifier(object):
+    # Takes the place of the output writer for crawl_card(). The rows are already
+    # in the store, so all that is left is to tell the daemon there is something new.
+    def __init__(self, daemon):
+        self.daemon = daemon
+        self.rows = 0
+
+    def write(self, row):
+        self.rows += 1
+
+    def flush(self):
+        if self.rows:
+            self.daemon.notify()
+        self.rows = 0
+
+    def close(self):
+        self.flush()
+
+
+class Account(object):
+    # One account, and the thread that keeps it logged in and crawled. Everything
+    # but asking for the password runs in that thread, since neither sqlite nor
+    # webdriver like to be shared between threads.
+    source = None
+    module = None
+
+    def __init__(self, daemon, name, args):
+        self.daemon = daemon
+        self.name = name
+        self.args = args
+        self.state = 'starting'
+        self.loggedin = False
+        self.crawled = None
+        self.error = None
+        self.crawls = 0
+        self.logins = 0
+        self.failures = 0
+        self.password = None
+        self.store = None
+        self.driver = None
+        self._browser = None
+        self._wakeup = threading.Event()
+        self._thread = None
+        if args.baseurl:
+            self.module.set_baseurl(args.baseurl)
+
+    def account(self):
+        raise NotImplementedError
+
+    def ask_password(self):
+        pass
+
+    def login(self):
+        raise NotImplementedError
+
+    def crawl(self):
+        # Crawl once, raising SessionExpired if we have been logged out
+        raise NotImplementedError
+
+    def status(self):
+        return {
+            'name': self.name,
+            'source': self.source,
+            'account': self.account(),
+            'state': self.state,
+            'logins': self.logins,
+            'crawls': self.crawls,
+            'last_crawl': self.crawled and datetime.datetime.fromtimestamp(self.crawled).isoformat(' ', 'seconds'),
+            'error': self.error,
+        }
+
+    def lease_browser(self):
+        # Keep a browser for as long as the session lives
+        self.release_browser()
+        self._browser = contextlib.ExitStack()
+        self.driver = self._browser.enter_context(self.daemon.pool.lease())
+        # This is not always very fast
+        self.driver.implicitly_wait(3)
+
+    def release_browser(self):
+        if self._browser:
+            browser = self._browser
+            self._browser = None
+            self.driver = None
+            browser.close()
+
+    def store_rows(self, rows):
+        # Store a batch of (id, row), and wake up whoever waits for new transactions
+        metrics.add_rows(len(rows))
+        if not self.store:
+            self.store = txstore.TransactionStore(self.daemon.store, self.source, self.account())
+        changed = self.store.update(rows)
+        if changed:
+            status("{}: {} new or changed transactions".format(self.name, len(changed)))
+            self.daemon.notify()
+
+    def refresh(self):
+        self._wakeup.set()
+
+    def _run(self):
+        while not self.daemon.stopping:
+            fresh = False
+            try:
+                if not self.loggedin:
+                    self.state = 'logging in'
+                    # Only one account at a time gets to bother the user
+                    with self.daemon.loginlock:
+                        if self.daemon.stopping:
+                            break
+                        self.login()
+                    self.loggedin = True
+                    self.logins += 1
+                    self.failures = 0
+                    fresh = True
+                self.state = 'crawling'
+                self.crawl()
+                self.crawls += 1
+                self.crawled = time.time()
+                self.failures = 0
+                self.error = None
+                self.state = 'idle'
+            except SessionExpired:
+                status("{}: session has expired, logging in again".format(self.name))
+                self.loggedin = False
+                self.state = 'expired'
+                # Right away, unless we just logged in and it didn't stick
+                if not fresh:
+                    continue
+            except (Exception, SystemExit) as e:
+                # Code shared with the crawlers may still exit when it gives up, which
+                # must not end the thread
+                status("{}: {}: {}".format(self.name, type(e).__name__, e))
+                self.failures += 1
+                self.error = '{}: {}'.format(type(e).__name__, e)
+                self.state = 'failed'
+                # Start over with a new login if it keeps failing, in case it's the
+                # session (or the browser) that is broken
+                if self.failures >= 3:
+                    self.loggedin = False
+                # Right away if the pool has recycled our browser
+                elif self.driver and not self.daemon.pool.leased(self.driver):
+                    status("{}: browser was recycled, logging in again".format(self.name))
+                    self.release_browser()
+                    self.loggedin = False
+                    continue
+            self._wakeup.wait(self.daemon.interval)
+            self._wakeup.clear()
+        self.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def join(self, timeout):
+        if self._thread:
+            self._thread.join(timeout)
+
+    def close(self):
+        self.release_browser()
+        if self.store:
+            self.store.close()
+            self.store = None
+
+
+class AmexAccount(Account):
+    source = 'amex'
+
+    def __init__(self, daemon, name, args):
+        from cardcrawler import amex
+        self.module = amex
+        super().__init__(daemon, name, args)
+        self.sess = None
+        self.tokens = []
+        self.cache = None
+        # Stop at the first closed statement we already have
+        args.store = daemon.store
+        args.since_last_sync = True
+
+    def account(self):
+        return ','.join(self.tokens) or self.args.username
+
+    def ask_password(self):
+        self.password = self.args.password or slots.getpass('Amex password for {0}: '.format(self.args.username))
+
+    def login(self):
+        amex = self.module
+        self.sess = amex.create_session(self.args.workers)
+        amex.login(self.sess, self.args, self.password)
+        if self.args.token:
+            self.tokens = [self.args.token]
+        else:
+            with metrics.phase('navigation'):
+                self.tokens = [c['token'] for c in amex.get_cards(self.sess)]
+        if self.args.responsecache and not self.cache:
+            from cardcrawler import responsecache
+            self.cache = responsecache.ResponseCache(self.args.responsecache)
+
+    def _check(self, token):
+        if not self.module.check_session(self.sess, token):
+            raise SessionExpired()
+
+    def crawl(self):
+        for token in self.tokens:
+            try:
+                failed = self.module.crawl_card(self.sess, token, self.args, Notifier(self.daemon), self.cache)
+            except Exception:
+                self._check(token)
+                raise
+            if failed:
+                self._check(token)
+                raise Exception("{} statements could not be fetched".format(failed))
+
+    def close(self):
+        super().close()
+        if self.cache:
+            self.cache.close()
+            self.cache = None
+
+
+class SebAccount(Account):
+    source = 'seb'
+
+    def __init__(self, daemon, name, args):
+        from cardcrawler import seb
+        self.module = seb
+        super().__init__(daemon, name, args)
+        self.cardtype = seb.cardtypes[args.cardtype]
+
+    def account(self):
+        return '{}/{}'.format(self.args.personnr, self.args.cardtype)
+
+    def login(self):
+        self.lease_browser()
+        self.module.login(self.driver, self.cardtype, self.args)
+
+    def crawl(self):
+        if not self.module.open_overview(self.driver, self.cardtype, self.args):
+            raise SessionExpired()
+        rows = self.module.read_uninvoiced(self.driver, self.args)
+        self.store_rows([(r[0], r) for r in rows])
+
+
+class RevolutAccount(Account):
+    source = 'revolut'
+
+    def __init__(self, daemon, name, args):
+        from cardcrawler import revolut
+        self.module = revolut
+        super().__init__(daemon, name, args)
+
+    def account(self):
+        return self.args.phone
+
+    def ask_password(self):
+        self.password = self.args.password or slots.getpass('Revolut password for {0}: '.format(self.args.phone))
+
+    def login(self):
+        self.lease_browser()
+        self.module.login(self.driver, self.args, self.password)
+
+    def crawl(self):
+        if not self.module.reload_transactions(self.driver, self.args):
+            raise SessionExpired()
+        cutoff = self.args.since or (datetime.date.today() - datetime.timedelta(days=self.args.days))
+        rows = []
+        with metrics.phase('extraction'):
+            for date, group, pending in self.module.scrape_groups(self.driver, self.args.timeout):
+                if date < cutoff:
+                    break
+                rows += group
+        self.store_rows([(t[0], t) for t in rows])
+
+
+accounttypes = {
+    'amex': AmexAccount,
+    'seb': SebAccount,
+    'revolut': RevolutAccount,
+}
+
+
+class Daemon(object):
+    def __init__(self, store, interval, pool=None):
+        self.store = store
+        self.interval = interval
+        self.pool = pool
+        self.accounts = []
+        # The api can be asked before any account has stored anything
+        txstore.create(store)
+        self.stopping = False
+        self.loginlock = threading.Lock()
+        # Bumped and notified whenever anything new has been stored
+        self.generation = 0
+        self.changed = threading.Condition()
+
+    def notify(self):
+        with self.changed:
+            self.generation += 1
+            self.changed.notify_all()
+
+    def query(self, after=0, since=None, source=None, account=None, wait=0):
+        # Returns the stored transactions matching the query, waiting up to wait
+        # seconds for some to show up if there are none yet
+        deadline = time.time() + wait
+        while True:
+            with self.changed:
+                generation = self.generation
+            rows = list(txstore.read(self.store, source, account, after, since))
+            if rows or self.stopping or time.time() >= deadline:
+                return rows
+            with self.changed:
+                # Only wait if nothing was stored while we were reading
+                if self.generation == generation:
+                    self.changed.wait(deadline - time.time())
+
+    def stop(self):
+        self.stopping = True
+        for a in self.accounts:
+            a.refresh()
+        self.notify()
+
+
+class ApiHandler(http.server.BaseHTTPRequestHandler):
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, code, body, ctype='application/json'):
+        body = body.encode('utf8')
+        self.send_response(code)
+        self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, code, o):
+        # Dates and decimals are written as strings, like the json output does
+        self._send(code, json.dumps(o, default=str))
+
+    def do_GET(self):
+        daemon = self.server.crawlerdaemon
+        url = urllib.parse.urlparse(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        if url.path == '/transactions':
+            try:
+                after = int(query.get('after', 0))
+                since = query.get('since', None) and datetime.datetime.fromisoformat(query['since'])
+                wait = float(query.get('wait', 0))
+                if not math.isfinite(wait) or wait < 0:
+                    raise ValueError("wait must be a number of seconds")
+                wait = min(wait, maxwait)
+            except ValueError as e:
+                self._json(400, {'error': str(e)})
+                return
+            rows = daemon.query(after, since, query.get('source', None), query.get('account', None), wait)
+            transactions = []
+            for seq, source, account, txid, row in rows:
+                t = transaction.Transaction.from_stored(source, account, row).as_dict()
+                t['seq'] = seq
+                transactions.append(t)
+            self._json(200, {'last': rows and rows[-1][0] or after, 'transactions': transactions})
+        elif url.path == '/status':
+            self._json(200, {'accounts': [a.status() for a in daemon.accounts]})
+        elif url.path == '/metrics':
+            self._send(200, metrics.run.as_prometheus(), 'text/plain; version=0.0.4')
+        else:
+            self._json(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        daemon = self.server.crawlerdaemon
+        url = urllib.parse.urlparse(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        if url.path != '/refresh':
+            self._json(404, {'error': 'Not found'})
+            return
+        accounts = [a for a in daemon.accounts if a.name == query.get('account', a.name)]
+        if not accounts:
+            self._json(404, {'error': 'Unknown account {}'.format(query['account'])})
+            return
+        for a in accounts:
+            a.refresh()
+        self._json(202, {'refreshing': [a.name for a in accounts]})
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def create_server(args):
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        # The api hands out bank transactions, so only to ourselves. The socket is
+        # created that way, so it's never accessible to anyone else, not even
+        # for a moment.
+        umask = os.umask(0o077)
+        try:
+            server = UnixHTTPServer(args.socket, ApiHandler)
+        finally:
+            os.umask(umask)
+    else:
+        (host, port) = args.listen.rsplit(':', 1)
+        server = http.server.ThreadingHTTPServer((host, int(port)), ApiHandler)
+    return server
+
+
+def main(args):
+    metrics.setup('daemon', args)
+
+    try:
+        accounts = batch.read_accounts(args.config)
+    except (OSError, ValueError, configparser.Error) as e:
+        status("Failed to read config: {}".format(e))
+        sys.exit(1)
+    if args.accounts:
+        unknown = set(args.accounts) - set(a[0] for a in accounts)
+        if unknown:
+            status("Unknown accounts: {}".format(', '.join(sorted(unknown))))
+            sys.exit(1)
+        accounts = [a for a in accounts if a[0] in args.accounts]
+
+    # Every account gets the same arguments as it would as its own crawler
+    parser = cli.create_parser()
+    parsed = []
+    for name, crawler, arguments in accounts:
+        try:
+            parsed.append((name, crawler, parser.parse_args([crawler] + arguments)))
+        except SystemExit:
+            status("Account {} has invalid arguments".format(name))
+            sys.exit(1)
+
+    # One browser for every account that keeps one, started while the passwords
+    # are asked for. The browser options are taken from the first of them.
+    browseraccounts = [accountargs for name, crawler, accountargs in parsed if crawler != 'amex']
+    pool = None
+    if browseraccounts:
+        # Without stats, since they are only read when a lease ends, and chrome
+        # would keep the log of every request until then
+        pool = browserpool.BrowserPool.from_args(browseraccounts[0], size=len(browseraccounts), refill=True,
+                                                 maxlease=args.maxlease, stats=False)
+
+    daemon = Daemon(args.store, args.interval, pool)
+    for name, crawler, accountargs in parsed:
+        daemon.accounts.append(accounttypes[crawler](daemon, name, accountargs))
+
+    # Passwords are asked for up front, and then kept for when sessions expire
+    for a in daemon.accounts:
+        a.ask_password()
+
+    server = create_server(args)
+    server.crawlerdaemon = daemon
+
+    # Stop cleanly on SIGTERM too, so no browsers are left behind
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        for a in daemon.accounts:
+            a.start()
+        status("Serving the api on {}".format(args.socket or 'http://{}/'.format(args.listen)))
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        status("Stopping")
+        daemon.stop()
+        server.server_close()
+        for a in daemon.accounts:
+            a.join(30)
+        # Anything still busy after that gets its browser taken away
+        for a in daemon.accounts:
+            a.release_browser()
+        if pool:
+            pool.close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
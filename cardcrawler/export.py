@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+#
+# Write out transactions from the local store, without crawling anything. Rows of
+# all banks are normalized into Transactions, so they all have the same columns.
+#
+
+import os
+import sys
+
+from cardcrawler import outputwriter
+from cardcrawler import transaction
+from cardcrawler import txstore
+
+
+def status(msg):
+    print(msg, file=sys.stderr)
+
+
+def main(args):
+    if not os.path.exists(args.store):
+        status("Store {} does not exist".format(args.store))
+        sys.exit(1)
+
+    writer = outputwriter.get_writer(args.format, args.output, transaction.Transaction.__slots__,
+                                     normalize=lambda values: transaction.Transaction(*values))
+    count = 0
+    last = args.after
+    for seq, source, account, txid, row in txstore.read(args.store, args.source, args.account, args.after):
+        writer.write(transaction.Transaction.from_stored(source, account, row).values())
+        count += 1
+        last = seq
+    writer.close()
+
+    # The last seq can be given to --after next time, to only get what changed since
+    status("Exported {} transactions, up to sequence number {}".format(count, last))
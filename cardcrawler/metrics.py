@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+#
+# Timing and instrumentation of crawler runs.
+#
+# Records the time spent in each phase of a run (login, 2fa, navigation,
+# extraction, output) as spans, along with webdriver command counts and latency,
+# http request counts, bytes and latency, and the number of rows extracted.
+# Prints a summary of the phases at the end, and can write everything to a json
+# file or a prometheus textfile so runs can be monitored over time.
+#
+
+import atexit
+import collections
+import contextlib
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+
+
+phases = ('login', '2fa', 'navigation', 'extraction', 'output')
+
+
+def _budget(s):
+    (name, seconds) = s.split('=', 1)
+    return (name, float(seconds))
+
+
+def add_arguments(parser):
+    parser.add_argument('--budget', type=_budget, action='append', default=[], metavar='PHASE=SECONDS',
+                        help='Time budget for a phase ({}), can be given multiple times'.format(', '.join(phases)))
+    parser.add_argument('--metrics', type=str, help='Write metrics for the run to this file (prometheus textfile if it ends in .prom, otherwise json)')
+
+
+class Metrics(object):
+    def __init__(self):
+        self.crawler = None
+        self.budgets = {}
+        self.totals = {}
+        # Only the latest spans are kept, so a long running daemon doesn't grow forever
+        self.spans = collections.deque(maxlen=100000)
+        self.webdriver = {}
+        self.http = {'requests': 0, 'errors': 0, 'bytes': 0, 'seconds': 0}
+        self.browser = {'requests': 0, 'blocked': 0, 'bytes': 0}
+        self.rows = 0
+        self.started = time.time()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def _stack(self):
+        # Every thread has its own nesting of phases
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _add(self, name, seconds):
+        with self._lock:
+            self.totals[name] = self.totals.get(name, 0) + seconds
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        # Phases can be nested, e.g. writing output while extracting, in which
+        # case the time is only counted for the innermost one. Every phase is
+        # still recorded as a span of its own.
+        stack = self._stack
+        now = time.perf_counter()
+        start = time.time()
+        if stack:
+            parent = stack[-1]
+            self._add(parent[0], now - parent[1])
+        current = [name, now]
+        stack.append(current)
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self._add(name, end - current[1])
+            stack.pop()
+            if stack:
+                stack[-1][1] = end
+            self.spans.append({
+                'name': name,
+                'start': start,
+                'duration': time.time() - start,
+                'depth': len(stack),
+            })
+
+    def webdriver_command(self, command, seconds):
+        with self._lock:
+            c = self.webdriver.setdefault(command, {'count': 0, 'seconds': 0})
+            c['count'] += 1
+            c['seconds'] += seconds
+
+    def http_request(self, nbytes, seconds, error):
+        with self._lock:
+            self.http['requests'] += 1
+            self.http['bytes'] += nbytes
+            self.http['seconds'] += seconds
+            if error:
+                self.http['errors'] += 1
+
+    def browser_network(self, stats):
+        with self._lock:
+            for k in self.browser:
+                self.browser[k] += stats.get(k, 0)
+
+    def add_rows(self, n):
+        with self._lock:
+            self.rows += n
+
+    def rows_per_second(self):
+        extraction = self.totals.get('extraction', 0)
+        return extraction and self.rows / extraction or 0
+
+    def over_budget(self):
+        return [(name, self.totals.get(name, 0), budget) for name, budget in self.budgets.items() if self.totals.get(name, 0) > budget]
+
+    def report(self, f=sys.stderr):
+        names = [p for p in phases if p in self.totals] + sorted(p for p in self.totals if p not in phases)
+        print("Time spent per phase:", file=f)
+        for name in names:
+            budget = self.budgets.get(name, None)
+            print("  {:<12} {:8.2f}s{}".format(
+                name,
+                self.totals[name],
+                budget is not None and self.totals[name] > budget and " (over budget of {:.2f}s)".format(budget) or "",
+            ), file=f)
+        print("  {:<12} {:8.2f}s".format('total', sum(self.totals.values())), file=f)
+        if self.rows:
+            print("{} rows extracted, {:.1f} rows/second".format(self.rows, self.rows_per_second()), file=f)
+
+    def as_dict(self):
+        return {
+            'crawler': self.crawler,
+            'started': datetime.datetime.fromtimestamp(self.started).isoformat(),
+            'duration': time.time() - self.started,
+            'phases': self.totals,
+            'budgets': self.budgets,
+            'over_budget': [name for name, spent, budget in self.over_budget()],
+            'spans': list(self.spans),
+            'webdriver': {
+                'commands': sum(c['count'] for c in self.webdriver.values()),
+                'seconds': sum(c['seconds'] for c in self.webdriver.values()),
+                'by_command': self.webdriver,
+            },
+            'http': self.http,
+            'browser': self.browser,
+            'rows': self.rows,
+            'rows_per_second': self.rows_per_second(),
+        }
+
+    def as_prometheus(self):
+        labels = 'crawler="{}"'.format(self.crawler or '')
+        lines = []
+
+        def _metric(name, mtype, helptext, values):
+            lines.append('# HELP cardcrawler_{} {}'.format(name, helptext))
+            lines.append('# TYPE cardcrawler_{} {}'.format(name, mtype))
+            for extra, value in values:
+                lines.append('cardcrawler_{}{{{}{}}} {}'.format(name, labels, extra, value))
+
+        _metric('run_seconds', 'gauge', 'Wall clock time of the run', [('', time.time() - self.started)])
+        _metric('last_run_timestamp_seconds', 'gauge', 'When the run started', [('', self.started)])
+        _metric('phase_seconds', 'gauge', 'Time spent in each phase', [
+            (',phase="{}"'.format(k), v) for k, v in sorted(self.totals.items())
+        ])
+        _metric('webdriver_commands_total', 'counter', 'Number of webdriver commands', [
+            (',command="{}"'.format(k), v['count']) for k, v in sorted(self.webdriver.items())
+        ])
+        _metric('webdriver_command_seconds_total', 'counter', 'Time spent in webdriver commands', [
+            (',command="{}"'.format(k), v['seconds']) for k, v in sorted(self.webdriver.items())
+        ])
+        _metric('http_requests_total', 'counter', 'Number of http requests', [('', self.http['requests'])])
+        _metric('http_errors_total', 'counter', 'Number of http requests that failed', [('', self.http['errors'])])
+        _metric('http_response_bytes_total', 'counter', 'Bytes received in http responses', [('', self.http['bytes'])])
+        _metric('http_request_seconds_total', 'counter', 'Time spent in http requests', [('', self.http['seconds'])])
+        _metric('browser_requests_total', 'counter', 'Requests made by the browser', [('', self.browser['requests'])])
+        _metric('browser_blocked_requests_total', 'counter', 'Requests blocked in the browser', [('', self.browser['blocked'])])
+        _metric('browser_bytes_total', 'counter', 'Bytes loaded by the browser', [('', self.browser['bytes'])])
+        _metric('rows_total', 'counter', 'Number of rows extracted', [('', self.rows)])
+        _metric('rows_per_second', 'gauge', 'Rows extracted per second spent extracting', [('', self.rows_per_second())])
+        return "\n".join(lines) + "\n"
+
+    def write(self, filename):
+        # Write to a temporary file and rename it, so whoever collects it never
+        # sees a half written file.
+        with open(filename + '.tmp', 'w') as f:
+            if filename.endswith('.prom'):
+                f.write(self.as_prometheus())
+            else:
+                json.dump(self.as_dict(), f, indent=2)
+        os.replace(filename + '.tmp', filename)
+
+
+# The metrics of the current run
+run = Metrics()
+
+
+def setup(crawler, args):
+    # Configure the metrics from the commandline. The metrics file is written
+    # when the process exits, so we get one for failed runs too.
+    run.crawler = crawler
+    run.budgets = dict(args.budget)
+    if args.metrics:
+        atexit.register(run.write, args.metrics)
+
+
+def phase(name):
+    return run.phase(name)
+
+
+def add_rows(n):
+    run.add_rows(n)
+
+
+def report(f=sys.stderr):
+    run.report(f)
+
+
+def instrument_driver(driver):
+    # Count and time every command sent to the browser
+    execute = driver.command_executor.execute
+
+    def _execute(command, params):
+        start = time.perf_counter()
+        try:
+            return execute(command, params)
+        finally:
+            run.webdriver_command(command, time.perf_counter() - start)
+    driver.command_executor.execute = _execute
+
+
+def instrument_session(sess):
+    # Count and time every request made through a requests session
+    def _response(r, *args, **kwargs):
+        run.http_request(len(r.content), r.elapsed.total_seconds(), r.status_code >= 400)
+    sess.hooks['response'].append(_response)
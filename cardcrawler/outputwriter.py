@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+#
+# Streaming output writers, so rows can be written as soon as they have been
+# crawled instead of collecting everything in memory first.
+#
+
+import csv
+import json
+
+from cardcrawler import columnar
+
+
+formats = ('csv', 'json', 'ndjson', 'columnar')
+
+
+class CsvWriter(object):
+    def __init__(self, f, columns, tocsv=None):
+        self.f = f
+        self.tocsv = tocsv
+        self.writer = csv.writer(f)
+        self.writer.writerow(columns)
+
+    def write(self, row):
+        self.writer.writerow(self.tocsv(row) if self.tocsv else row)
+
+    def flush(self):
+        self.f.flush()
+
+    def close(self):
+        self.flush()
+
+
+class NdjsonWriter(object):
+    def __init__(self, f, columns):
+        self.f = f
+        self.columns = columns
+
+    def _encode(self, row, indent=None):
+        # Rows that aren't already dicts get their keys from the columns. Dates and
+        # decimals are written as strings.
+        if not isinstance(row, dict):
+            row = dict(zip(self.columns, row))
+        return json.dumps(row, default=str, indent=indent)
+
+    def write(self, row):
+        self.f.write(self._encode(row))
+        self.f.write("\n")
+
+    def flush(self):
+        self.f.flush()
+
+    def close(self):
+        self.flush()
+
+
+class JsonArrayWriter(NdjsonWriter):
+    # Writes a regular json array, but one element at a time
+    def __init__(self, f, columns, pretty=False):
+        super().__init__(f, columns)
+        self.indent = pretty and 2 or None
+        self.first = True
+        self.f.write("[")
+
+    def write(self, row):
+        if not self.first:
+            # Same separators as json.dumps() of the whole list would use
+            self.f.write(self.indent and "," or ", ")
+        self.first = False
+        if self.indent:
+            self.f.write("\n")
+            self.f.write("\n".join(" " * self.indent + l for l in self._encode(row, self.indent).splitlines()))
+        else:
+            self.f.write(self._encode(row))
+
+    def close(self):
+        self.f.write(self.indent and not self.first and "\n]\n" or "]\n")
+        self.flush()
+
+
+def get_writer(fmt, f, columns, tocsv=None, pretty=False, normalize=None):
+    # tocsv turns a row into a list of values for the csv columns, if it's not
+    # already one. normalize turns a row into a Transaction, for columnar output.
+    if fmt == 'csv':
+        return CsvWriter(f, columns, tocsv)
+    elif fmt == 'ndjson':
+        return NdjsonWriter(f, columns)
+    elif fmt == 'json':
+        return JsonArrayWriter(f, columns, pretty)
+    elif fmt == 'columnar':
+        return columnar.ColumnarWriter(f, normalize)
+    raise ValueError("Unknown output format {}".format(fmt))
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+#
+# Content addressed on-disk cache of api responses.
+#
+# Responses are stored as gzipped json named by the sha256 of their contents,
+# so identical responses (like empty statements) are only stored once. A small
+# sqlite index maps each key to the hash of its response, and keeps track of
+# when it was last used so the cache can be evicted by age or size. Nothing is
+# ever expired on its own, it's up to the caller to only cache what doesn't
+# change.
+#
+
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+
+class ResponseCache(object):
+    def __init__(self, directory):
+        self.directory = directory
+        # Responses are bank data, so keep them to ourselves
+        os.makedirs(os.path.join(directory, 'objects'), mode=0o700, exist_ok=True)
+        # Several crawlers can share a cache, so wait for each other's writes
+        self.conn = sqlite3.connect(os.path.join(directory, 'index.db'), timeout=30)
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS entries (
+ key text NOT NULL PRIMARY KEY,
+ hash text NOT NULL,
+ size integer NOT NULL,
+ stored real NOT NULL,
+ used real NOT NULL
+)""")
+        self.conn.commit()
+
+    def _path(self, h):
+        return os.path.join(self.directory, 'objects', h[:2], h[2:] + '.json.gz')
+
+    def _forget(self, key):
+        with self.conn:
+            self.conn.execute("DELETE FROM entries WHERE key=?", (key,))
+
+    def get(self, key):
+        # Returns the cached response, or None if there isn't one (or it's broken)
+        row = self.conn.execute("SELECT hash FROM entries WHERE key=?", (key,)).fetchone()
+        if not row:
+            return None
+        try:
+            with gzip.open(self._path(row[0]), 'rb') as f:
+                data = f.read()
+        except (OSError, EOFError):
+            self._forget(key)
+            return None
+        if hashlib.sha256(data).hexdigest() != row[0]:
+            self._forget(key)
+            return None
+        with self.conn:
+            self.conn.execute("UPDATE entries SET used=? WHERE key=?", (time.time(), key))
+        return json.loads(data.decode('utf8'))
+
+    def put(self, key, response):
+        data = json.dumps(response, sort_keys=True, separators=(',', ':')).encode('utf8')
+        h = hashlib.sha256(data).hexdigest()
+        path = self._path(h)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Written under a temporary name, so a crashed write never looks complete
+            tmp = '{}.{}.tmp'.format(path, os.getpid())
+            with gzip.open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries (key, hash, size, stored, used) VALUES (?, ?, ?, ?, ?)",
+                (key, h, os.path.getsize(path), now, now),
+            )
+
+    def evict(self, maxsize=None, maxage=None):
+        # Drop entries that haven't been used for maxage seconds, and then the least
+        # recently used ones until the cache is at most maxsize bytes. Returns the
+        # number of entries dropped.
+        dropped = 0
+        with self.conn:
+            if maxage is not None:
+                dropped += self.conn.execute("DELETE FROM entries WHERE used<?", (time.time() - maxage,)).rowcount
+            if maxsize is not None:
+                total = 0
+                counted = set()
+                for key, h, size in self.conn.execute("SELECT key, hash, size FROM entries ORDER BY used DESC").fetchall():
+                    if h not in counted:
+                        counted.add(h)
+                        total += size
+                    if total > maxsize:
+                        self.conn.execute("DELETE FROM entries WHERE key=?", (key,))
+                        dropped += 1
+        # Then remove the responses nothing refers to anymore
+        referenced = set(h for (h,) in self.conn.execute("SELECT DISTINCT hash FROM entries"))
+        objects = os.path.join(self.directory, 'objects')
+        for prefix in os.listdir(objects):
+            for name in os.listdir(os.path.join(objects, prefix)):
+                if name.endswith('.json.gz') and prefix + name[:-len('.json.gz')] not in referenced:
+                    try:
+                        os.remove(os.path.join(objects, prefix, name))
+                    except OSError:
+                        pass
+        return dropped
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+
+import sys
+import datetime
+import re
+from decimal import Decimal
+import json
+import base64
+import itertools
+import urllib.parse
+import requests
+
+from cardcrawler import browserpool
+from cardcrawler import metrics
+from cardcrawler import outputwriter
+from cardcrawler import slots
+from cardcrawler import transaction
+from cardcrawler import txstore
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as cond
+from selenium.webdriver.common.action_chains import ActionChains
+from selenium.webdriver.common.keys import Keys
+from selenium.common.exceptions import TimeoutException, ElementClickInterceptedException, ElementNotInteractableException, NoSuchElementException
+
+columns = ['id', 'charge_date', 'description', 'amount', 'currency']
+
+# Where the web app is, can be changed with --baseurl
+baseurl = 'https://app.revolut.com'
+
+# Currencies that the api doesn't give in hundredths
+zero_decimal_currencies = ('JPY', 'KRW', 'ISK', 'CLP', 'VND')
+
+
+def status(msg):
+    print(msg, file=sys.stderr)
+
+
+# Identifies the focused input and how much has been typed into it
+_typed_js = """
+var e = document.activeElement;
+return e ? [Array.prototype.indexOf.call(document.querySelectorAll('input'), e), (e.value || '').length] : null;
+"""
+
+
+def send_slow_string(driver, s, timeout):
+    # The passcode boxes can't handle fast typing, so type one character at a time
+    # and wait (up to timeout for each) for it to register (the value changing or
+    # the focus moving to the next box) before typing the next.
+    for c in s:
+        before = driver.execute_script(_typed_js)
+        ActionChains(driver).send_keys(c).perform()
+        try:
+            WebDriverWait(driver, timeout, poll_frequency=0.05).until(lambda d: d.execute_script(_typed_js) != before)
+        except TimeoutException:
+            pass
+
+
+def click_past_popups(driver, locator, timeout):
+    # Click an element, closing whatever popup gets in the way of it (like the
+    # really stupid "click here for an intro" one) until the click goes through.
+    def _click(d):
+        try:
+            d.find_element(*locator).click()
+            return True
+        except (ElementClickInterceptedException, ElementNotInteractableException, NoSuchElementException):
+            ActionChains(d).send_keys(Keys.ESCAPE).perform()
+            return False
+    WebDriverWait(driver, timeout).until(_click)
+
+
+# Get the transaction groups and their rows on the page in a single call,
+# instead of several webdriver roundtrips for each transaction. The two spans
+# of each row are its direct children, the first one holding title and time
+# and the second one the amount.
+# Every row returned is tagged with its id, so the next call only returns rows
+# that have been loaded since (the id is compared, in case the list reuses
+# elements). The last row is then scrolled into view to make the page load more.
+_transaction_groups_js = """
+var result = [];
+var last = null;
+document.querySelectorAll('div[role="transactions-group"]').forEach(function(g) {
+  var rows = [];
+  g.querySelectorAll('button[data-transactionid]').forEach(function(t) {
+    var id = t.getAttribute('data-transactionid');
+    last = t;
+    if (t.getAttribute('data-crawled') == id)
+      return;
+    t.setAttribute('data-crawled', id);
+    var spans = Array.prototype.filter.call(t.children, function(c) { return c.tagName == 'SPAN'; });
+    var inner = spans.length ? spans[0].getElementsByTagName('span') : [];
+    rows.push({
+      id: id,
+      title: inner.length > 0 ? inner[0].innerText : '',
+      time: inner.length > 1 ? inner[1].innerText : '',
+      amount: spans.length > 1 ? spans[1].innerText : ''
+    });
+  });
+  if (rows.length)
+    result.push({group: g.getAttribute('data-group'), rows: rows});
+});
+if (last)
+  last.scrollIntoView();
+return result;
+"""
+
+_has_new_rows_js = """
+return Array.prototype.some.call(document.querySelectorAll('button[data-transactionid]'), function(t) {
+  return t.getAttribute('data-crawled') != t.getAttribute('data-transactionid');
+});
+"""
+
+
+def get_transaction_groups(driver):
+    return driver.execute_script(_transaction_groups_js)
+
+
+def wait_for_new_rows(driver, timeout):
+    # Wait for rows that get_transaction_groups() hasn't returned yet. If
+    # scrolling to the last row didn't trigger loading more, try a page down
+    # before giving up.
+    for i in range(2):
+        try:
+            WebDriverWait(driver, timeout / 2).until(lambda d: d.execute_script(_has_new_rows_js))
+            return True
+        except TimeoutException:
+            ActionChains(driver).send_keys(Keys.PAGE_DOWN).perform()
+    return False
+
+
+def parse_transaction(t, date):
+    # Turn a row from get_transaction_groups() into a transaction tuple, or None
+    # if it's something we don't want (failed, pending or currency exchange).
+    title = t['title'].strip()
+    timeval = t['time'].strip()
+    if timeval.startswith('Pending') or timeval.startswith('Failed') or timeval.startswith('Insufficient balance'):
+        return None
+    if re.match(r'(Sold|Bought) \w+ (to|with) \w+', title):
+        return None
+    try:
+        fulltime = datetime.datetime.combine(date, datetime.datetime.strptime(timeval, "%H:%M %p").time())
+    except ValueError:
+        fulltime = datetime.datetime.combine(date, datetime.time(0, 0, 0))
+    (what, currency, amount) = t['amount'].split()
+    # Turn amount into a decimal *and* turn it negative (to match the kind of
+    # input we have from the other crawlers)
+    amount = -Decimal(amount.replace(',', ''))
+    if what.strip() == "-":
+        amount = -amount
+    return (t['id'], fulltime, title, amount, currency)
+
+
+def scrape_groups(driver, timeout):
+    # Yield (date, transactions, pending) for each group of transactions on the
+    # page, scrolling down for more until nothing more loads.
+    while True:
+        for g in get_transaction_groups(driver):
+            date = datetime.date.fromtimestamp(int(g['group'])/1000)
+            rows = []
+            pending = False
+            for t in g['rows']:
+                if t['time'].strip().startswith('Pending'):
+                    pending = True
+                    continue
+                row = parse_transaction(t, date)
+                if row:
+                    rows.append(row)
+            yield date, rows, pending
+        # More rows show up quickly if there are any, so the end of the list
+        # shouldn't cost the whole timeout
+        if not wait_for_new_rows(driver, timeout / 3):
+            status("No more transactions loading, we're done!")
+            return
+
+
+def capture_transactions_request(driver, timeout):
+    # Find the json request the web app used to load the transactions list in
+    # chrome's performance log, and return it together with its response body.
+    requests_seen = {}
+
+    def _find_finished(d):
+        for msg in browserpool.read_network_log(d):
+            if msg['method'] == 'Network.requestWillBeSent':
+                req = msg['params']['request']
+                path = urllib.parse.urlparse(req['url']).path
+                if req['method'] == 'GET' and '/api/' in path and '/transactions' in path:
+                    requests_seen[msg['params']['requestId']] = req
+            elif msg['method'] == 'Network.loadingFinished' and msg['params']['requestId'] in requests_seen:
+                return msg['params']['requestId']
+        return False
+
+    requestid = WebDriverWait(driver, timeout).until(_find_finished)
+    body = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': requestid})
+    if body.get('base64Encoded', False):
+        body = base64.b64decode(body['body']).decode('utf8')
+    else:
+        body = body['body']
+    page = json.loads(body)
+    if not isinstance(page, list):
+        raise Exception("Unexpected response from transactions api {}".format(requests_seen[requestid]['url']))
+    return requests_seen[requestid], page
+
+
+def parse_api_transaction(t):
+    # Turn a transaction from the api into a transaction tuple, or None if it's
+    # something we don't want. Amounts are in minor units, and negative when money
+    # goes out, which we turn into positive to match the other crawlers.
+    if t.get('state', None) != 'COMPLETED' or t.get('type', None) == 'EXCHANGE':
+        return None
+    currency = t['currency']
+    amount = -Decimal(t['amount']).scaleb(0 if currency in zero_decimal_currencies else -2)
+    return (t['id'], datetime.datetime.fromtimestamp(t['startedDate']/1000), t.get('description', ''), amount, currency)
+
+
+def api_groups(request, firstpage, cookies):
+    # Yield (date, transactions, pending) for each day in the transaction list,
+    # starting from the page captured in the browser and then replaying the same
+    # request for older pages using the browser cookies.
+    sess = requests.session()
+    metrics.instrument_session(sess)
+    for c in cookies:
+        sess.cookies.set_cookie(requests.cookies.create_cookie(c['name'], c['value']))
+    headers = {k: v for k, v in request['headers'].items() if k.lower() not in ('cookie', 'content-length')}
+    url = urllib.parse.urlparse(request['url'])
+    query = urllib.parse.parse_qs(url.query)
+
+    page = firstpage
+    seenids = set()
+    while page:
+        newpage = [t for t in page if t['id'] not in seenids]
+        if not newpage:
+            break
+        seenids.update(t['id'] for t in newpage)
+        for date, txs in itertools.groupby(newpage, key=lambda t: datetime.date.fromtimestamp(t['startedDate']/1000)):
+            txs = list(txs)
+            rows = [r for r in (parse_api_transaction(t) for t in txs) if r]
+            yield date, rows, any(t.get('state', None) == 'PENDING' for t in txs)
+
+        # Pages are newest first, so ask for the ones before the last we got
+        query['to'] = [str(page[-1]['startedDate'])]
+        r = sess.get(url._replace(query=urllib.parse.urlencode(query, doseq=True)).geturl(), headers=headers)
+        r.raise_for_status()
+        page = r.json()
+
+
+def set_baseurl(url):
+    global baseurl
+    baseurl = url.rstrip('/')
+
+
+def login(driver, args, password):
+    with metrics.phase('login'):
+        status("Initiating login...")
+        driver.get(baseurl + '/start')
+
+        WebDriverWait(driver, args.timeout).until(cond.visibility_of_element_located((By.CSS_SELECTOR, 'input[aria-label="Country"]')))
+        # This defaults right, so ignore it for now
+        #driver.find_element_by_css_selector('input[aria-label="Country"]').send_keys("+46")
+
+        driver.find_element_by_css_selector("input[name=phoneNumber]").send_keys(args.phone.lstrip("0"))
+        driver.find_element_by_xpath("//button//span[contains(.,'Continue')]/..").click()
+
+        WebDriverWait(driver, args.timeout).until(cond.visibility_of_element_located((By.XPATH, "//span[contains(text(),'Enter passcode')]")))
+        # Each character should register right away, so don't wait the whole timeout
+        send_slow_string(driver, password, args.timeout / 15)
+
+        # SMS code flow, do we need both?
+#        WebDriverWait(driver, args.timeout).until(cond.visibility_of_element_located((By.XPATH, "//span[contains(text(),'6-digit code')]")))
+#        code = slots.getpass('One time password (from SMS): ')
+#        send_slow_string(driver, code, args.timeout / 15)
+
+    with metrics.phase('2fa'), slots.prompt():
+        # New flow using app
+        WebDriverWait(driver, args.timeout).until(cond.visibility_of_element_located((By.XPATH, "//span[contains(text(),'Revolut app')]")))
+        slots.notify("Approve the sign-in request in the revolut app, please")
+
+        # Wait for and get rid of cookie popup
+        WebDriverWait(driver, args.usertimeout).until(cond.visibility_of_element_located((By.XPATH, "//button//span[contains(.,'Allow all cookies')]/..")))
+        status("Thank you, login completed.")
+        driver.find_element_by_xpath("//button//span[contains(.,'Allow all cookies')]/..").click()
+
+    with metrics.phase('navigation'):
+        click_past_popups(driver, (By.CSS_SELECTOR, "a[href^='/transactions']"), args.timeout)
+
+        WebDriverWait(driver, args.timeout).until(cond.visibility_of_element_located((By.CSS_SELECTOR, "button[data-transactionid]")))
+
+
+def reload_transactions(driver, args):
+    # Load the transaction list again, and return False if we have been logged out
+    with metrics.phase('navigation'):
+        driver.get(baseurl + '/transactions')
+        WebDriverWait(driver, args.timeout).until(lambda d: '/start' in d.current_url or d.find_elements_by_css_selector('button[data-transactionid]'))
+        return '/start' not in driver.current_url
+
+
+def main(args):
+    metrics.setup('revolut', args)
+
+    if args.baseurl:
+        set_baseurl(args.baseurl)
+
+    if args.since_last_sync and not args.store:
+        print("--since-last-sync requires --store", file=sys.stderr)
+        sys.exit(1)
+
+    caps = None
+    if args.api:
+        # Needed to find the api requests in the network log
+        caps = {'goog:loggingPrefs': {'performance': 'ALL'}}
+
+    # Let chrome start while the user types the password. Under batch, only once
+    # we get a slot. Everything up to the end of the lease is in the try/finally,
+    # so a pre-started chrome is never left running.
+    pool = browserpool.BrowserPool.from_args(args, refill=False, prestart=not slots.limited('chrome'), capabilities=caps)
+    try:
+        if args.password:
+            password = args.password
+        else:
+            password = slots.getpass('Revolut password for {0}: '.format(args.phone))
+        if not password:
+            status("No password given.")
+            sys.exit(1)
+
+        cutoff = args.since or (datetime.date.today() - datetime.timedelta(days=args.days))
+
+        store = args.store and txstore.TransactionStore(args.store, 'revolut', args.phone)
+        writer = outputwriter.get_writer(args.format, args.output, columns,
+                                         normalize=lambda t: transaction.Transaction.from_revolut(t, args.phone))
+
+        # If the page re-renders a transaction (or api pages overlap) we could see it
+        # twice, so only let it through again if it has changed.
+        index = transaction.TransactionIndex()
+
+        def process_group(date, rows, pending):
+            # Write out a group of transactions from one day. Returns False when
+            # we're done and shouldn't look any further back.
+            if date < cutoff:
+                status("Reached {}, we're done!".format(cutoff))
+                return False
+            rows = [t for t in rows if index.add(transaction.Transaction.from_revolut(t, args.phone))]
+            metrics.add_rows(len(rows))
+            # A day in the past without pending transactions won't change anymore, so
+            # if we already have all of it there is nothing new further back.
+            if args.since_last_sync and date < datetime.date.today() and not pending and store.all_known([(t[0], t) for t in rows]):
+                status("Reached already synced transactions, we're done!")
+                return False
+            if store:
+                changed = store.update([(t[0], t) for t in rows])
+                if args.since_last_sync:
+                    rows = changed
+            with metrics.phase('output'):
+                for t in rows:
+                    writer.write(t)
+                writer.flush()
+            return True
+
+        with pool.lease() as driver:
+            # This is not always very fast
+            driver.implicitly_wait(3)
+
+            login(driver, args, password)
+
+            with metrics.phase('extraction'):
+                if args.api:
+                    # Once we have the first page of the api and the cookies, we don't need
+                    # the browser anymore.
+                    status("Capturing transactions api request...")
+                    apirequest, firstpage = capture_transactions_request(driver, args.timeout)
+                    cookies = driver.get_cookies()
+                else:
+                    for date, rows, pending in scrape_groups(driver, args.timeout):
+                        if not process_group(date, rows, pending):
+                            break
+    finally:
+        pool.close()
+
+    if args.api:
+        with metrics.phase('extraction'), slots.slot('http'):
+            for date, rows, pending in api_groups(apirequest, firstpage, cookies):
+                if not process_group(date, rows, pending):
+                    break
+
+    writer.close()
+    if store:
+        store.close()
+    metrics.report()
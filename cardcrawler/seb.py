@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+import sys
+from datetime import date
+
+from cardcrawler import browserpool
+from cardcrawler import metrics
+from cardcrawler import outputwriter
+from cardcrawler import slots
+from cardcrawler import transaction
+from cardcrawler import txstore
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as cond
+from selenium.common.exceptions import TimeoutException
+
+columns = ['id', 'charge_date', 'post_date', 'description', 'location', 'currency', 'foreignamount', 'amount']
+
+# Where the site is, can be changed with --baseurl
+baseurl = 'https://secure.sebkort.com'
+
+cardtypes = {
+    'saseurobonus': 'sase',
+    'nordicchoice': 'cose',
+}
+
+
+def status(msg):
+    print(msg, file=sys.stderr)
+
+
+# Get the id and all cells of every transaction row on the page in a single call,
+# instead of several webdriver roundtrips per row. The id is the id of the link,
+# or if it doesn't have one the last part of its url. Also returns the invoice
+# details header text (null on the uninvoiced page), which holds the year.
+_transaction_rows_js = """
+var info = document.querySelector('table.invoice-details tbody tr:nth-child(3) td:nth-child(2)');
+var rows = Array.prototype.map.call(document.querySelectorAll(arguments[0]), function(t) {
+  var a = t.querySelector('a.list-item-link');
+  var id = a ? (a.getAttribute('id') || a.href.split('/').pop()) : '';
+  return [id].concat(Array.prototype.map.call(t.querySelectorAll('ul.container li'), function(c) { return c.innerText; }));
+});
+return {info: info ? info.innerText : null, rows: rows};
+"""
+
+_invoice_links_js = """
+return Array.prototype.map.call(document.querySelectorAll('ul.listing li a'), function(a) { return a.href; });
+"""
+
+
+def get_transaction_rows(driver, selector):
+    # Returns the invoice details text and the raw transaction rows
+    r = driver.execute_script(_transaction_rows_js, selector)
+    return r['info'], r['rows']
+
+
+def parse_transaction_row(cells, year):
+    # Clean up the same way as webdriver's .text does, which we used before
+    r = [c.replace('\xa0', ' ').strip().replace('−', '-') for c in cells]
+
+    # Inject the year into the dates. For uninvoiced we use the current year.
+    chargedate = date(int(year), *[int(x) for x in r[1].split('-')])
+    postdate = date(int(year), *[int(x) for x in r[2].split('-')])
+
+    # We have to special case when the chargedate was previous year and postdate is this year,
+    # which happens right around the new year. It's always postdate that controls which month the
+    # entry appears on.
+    if chargedate > postdate:
+        if chargedate.month == 12 and postdate.month == 1:
+            chargedate = chargedate.replace(year=chargedate.year - 1)
+        else:
+            raise Exception("Transaction with chargedate ({}) before postdate ({}) found!".format(chargedate, postdate))
+
+    r[1] = str(chargedate)
+    r[2] = str(postdate)
+
+    return r
+
+
+def open_invoice(driver, url, timeout):
+    # Tag the invoice currently shown, if any, so we can tell when the new one has
+    # replaced it. If the page just reuses the same element, reload to be sure.
+    driver.execute_script("var s = document.querySelector('section#transactionTableContent'); if (s) s.setAttribute('data-crawled', '1');")
+    driver.get(url)
+    try:
+        WebDriverWait(driver, timeout / 3).until(cond.visibility_of_element_located((By.CSS_SELECTOR, 'section#transactionTableContent:not([data-crawled])')))
+    except TimeoutException:
+        driver.refresh()
+        WebDriverWait(driver, timeout).until(cond.visibility_of_element_located((By.CSS_SELECTOR, 'section#transactionTableContent')))
+
+
+def set_baseurl(url):
+    global baseurl
+    baseurl = url.rstrip('/')
+
+
+def login(driver, cardtype, args):
+    with metrics.phase('login'):
+        status("Initiating login...")
+        driver.get(baseurl + '/nis/m/{}/external/t/login/index'.format(cardtype))
+
+        # Click log in with bank-id on other device
+        driver.find_element_by_id("eidbtn1").click()
+
+    with metrics.phase('2fa'), slots.prompt():
+        slots.notify("Confirm login in with bank-id")
+        WebDriverWait(driver, args.usertimeout).until(cond.title_contains('Mitt'))
+
+
+def open_overview(driver, cardtype, args):
+    # Go back to the overview, and return False if we have been logged out
+    with metrics.phase('navigation'):
+        driver.get(baseurl + '/nis/m/{}/external/t/login/index'.format(cardtype))
+        WebDriverWait(driver, args.timeout).until(lambda d: 'Mitt' in d.title or d.find_elements_by_id('eidbtn1'))
+        return 'Mitt' in driver.title
+
+
+def read_uninvoiced(driver, args):
+    # Go from the overview to the uninvoiced transactions, and return them
+    with metrics.phase('navigation'):
+        WebDriverWait(driver, args.timeout).until(cond.visibility_of_element_located((By.CSS_SELECTOR, 'section.overview div.container ul li a[href*=uninvoice]')))
+
+        # Navitate to new transactions
+        driver.find_element_by_css_selector("a[href*=uninvoice] strong").click()
+
+        try:
+            # An empty list never shows up, so don't wait the whole timeout for it
+            WebDriverWait(driver, args.timeout / 10).until(cond.presence_of_element_located((By.CSS_SELECTOR, 'ul#cardTransactionContentTable li.list-item')))
+        except TimeoutException:
+            # No uninvoiced transactions
+            pass
+    with metrics.phase('extraction'):
+        info, rows = get_transaction_rows(driver, 'ul#cardTransactionContentTable li.list-item')
+        return [parse_transaction_row(r, date.today().year) for r in rows]
+
+
+def main(args):
+    metrics.setup('seb', args)
+
+    if args.baseurl:
+        set_baseurl(args.baseurl)
+
+    if args.since_last_sync and not args.store:
+        print("--since-last-sync requires --store", file=sys.stderr)
+        sys.exit(1)
+
+    cardtype = cardtypes[args.cardtype]
+    status("Getting card of type {}".format(cardtype))
+
+    account = '{}/{}'.format(args.personnr, args.cardtype)
+    store = args.store and txstore.TransactionStore(args.store, 'seb', account)
+    writer = outputwriter.get_writer(args.format, args.output, columns,
+                                     normalize=lambda r: transaction.Transaction.from_seb(r, account))
+
+    # A transaction that gets invoiced while we crawl can show up both as
+    # uninvoiced and on the invoice, so only let it through again if it has changed.
+    index = transaction.TransactionIndex()
+
+    def write_rows(rows):
+        # Rows are written out as soon as each page has been read
+        metrics.add_rows(len(rows))
+        rows = [r for r in rows if index.add(transaction.Transaction.from_seb(r, account))]
+        if store:
+            changed = store.update([(r[0], r) for r in rows])
+            if args.since_last_sync:
+                status("{} new or changed transactions".format(len(changed)))
+                rows = changed
+        with metrics.phase('output'):
+            for r in rows:
+                writer.write(r)
+            writer.flush()
+
+    pool = browserpool.BrowserPool.from_args(args, refill=False)
+    with pool.lease() as driver:
+        # This is not always very fast
+        driver.implicitly_wait(3)
+
+        login(driver, cardtype, args)
+
+        status("Login complete, getting uninvoiced transactions")
+        write_rows(read_uninvoiced(driver, args))
+
+        # Get the links to all invoices once, and then go straight to each of them
+        with metrics.phase('navigation'):
+            driver.get(baseurl + '/nis/m/{}/external/t/login/index#invoice'.format(cardtype))
+            WebDriverWait(driver, args.timeout).until(cond.visibility_of_element_located((By.CSS_SELECTOR, 'section.page-content ul.listing li')))
+            invoices = driver.execute_script(_invoice_links_js)
+
+        for n, url in enumerate(invoices[:args.months]):
+            status("Getting transactions for month {}".format(n+1))
+            with metrics.phase('navigation'):
+                open_invoice(driver, url, args.timeout)
+
+            with metrics.phase('extraction'):
+                # Get the contents, and the year from the header so we can store it correctly
+                info, rows = get_transaction_rows(driver, 'section#transactionTableContent ul.table li.list-item')
+                year = info.split()[1]
+                rows = [parse_transaction_row(r, year) for r in rows]
+
+                # Invoices never change, so once we find one we already have, there is
+                # nothing new further back.
+                if args.since_last_sync and store.all_known([(r[0], r) for r in rows]):
+                    status("Invoice already synced, stopping")
+                    break
+                write_rows(rows)
+
+        # We're done, log out because we're nice, and wait for it to go through
+        logout = driver.find_element_by_id('logoutbtn')
+        logout.click()
+        try:
+            WebDriverWait(driver, args.timeout).until(cond.staleness_of(logout))
+        except TimeoutException:
+            pass
+
+    writer.close()
+    if store:
+        store.close()
+    metrics.report()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+#
+# Limits on how many crawler processes use a shared resource at the same time.
+#
+# When crawlers are run in parallel by batchcrawler, it points them to a
+# directory of lock files with CARDCRAWLER_SLOTS, and sets the number of slots
+# of each kind with CARDCRAWLER_SLOTS_<KIND> (e.g. CARDCRAWLER_SLOTS_CHROME=2).
+# Each slot is a file, held with flock() for as long as it's in use, so a slot
+# is freed even if the process holding it dies. When not run from batchcrawler
+# there are no limits and all of this does nothing.
+#
+# The prompt slot (always one slot) is held while asking the user for anything,
+# like a password, a one time code or approving a login in an app, so only one
+# crawler at a time talks to the user.
+#
+
+import contextlib
+import fcntl
+import getpass as _getpass
+import os
+import sys
+import time
+
+
+def _limit(kind):
+    if kind == 'prompt':
+        return 1
+    return int(os.environ.get('CARDCRAWLER_SLOTS_{}'.format(kind.upper()), 0))
+
+
+def limited(kind):
+    # Whether there is a limit on a kind of slot, so it must not be used without one
+    return bool(os.environ.get('CARDCRAWLER_SLOTS', None)) and _limit(kind) > 0
+
+
+@contextlib.contextmanager
+def slot(kind):
+    # Wait for, and hold, one of the slots of a kind
+    directory = os.environ.get('CARDCRAWLER_SLOTS', None)
+    limit = _limit(kind)
+    if not directory or limit <= 0:
+        yield
+        return
+    while True:
+        for n in range(limit):
+            f = open(os.path.join(directory, '{}.{}'.format(kind, n)), 'a')
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                continue
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+                f.close()
+            return
+        time.sleep(0.2)
+
+
+def notify(msg):
+    # Tell the user something they need to act on. Under batchcrawler stderr
+    # goes to a log file, so also write it to the terminal, prefixed by which
+    # account it's about.
+    print(msg, file=sys.stderr)
+    account = os.environ.get('CARDCRAWLER_ACCOUNT', None)
+    if account and not sys.stderr.isatty():
+        try:
+            with open('/dev/tty', 'w') as tty:
+                print("[{}] {}".format(account, msg), file=tty)
+        except OSError:
+            pass
+
+
+def prompt():
+    return slot('prompt')
+
+
+def getpass(msg):
+    account = os.environ.get('CARDCRAWLER_ACCOUNT', None)
+    with prompt():
+        return _getpass.getpass(account and "[{}] {}".format(account, msg) or msg)
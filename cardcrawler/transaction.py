@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+#
+# One normalized transaction record shared by all crawlers, with Decimal amounts
+# and real dates, no matter what shape the bank gave it to us in. Amounts are
+# positive for money spent, like the crawlers output them.
+#
+
+import datetime
+import operator
+from decimal import Decimal
+
+
+def _date(s):
+    return s and datetime.date.fromisoformat(s[:10]) or None
+
+
+def _decimal(s):
+    # Handles both 1234.5 (amex) and swedish "1 234,50" (seb)
+    if s is None or s == '':
+        return None
+    if isinstance(s, float):
+        s = repr(s)
+    return Decimal(str(s).replace(' ', '').replace('\xa0', '').replace(',', '.'))
+
+
+class Transaction(object):
+    __slots__ = ('source', 'account', 'id', 'charge_date', 'post_date', 'description', 'location',
+                 'amount', 'currency', 'foreign_amount', 'foreign_currency', 'status')
+
+    # Type of each field, for anything that needs to store them
+    types = {
+        'source': 'str',
+        'account': 'str',
+        'id': 'str',
+        'charge_date': 'date',
+        'post_date': 'date',
+        'description': 'str',
+        'location': 'str',
+        'amount': 'decimal',
+        'currency': 'str',
+        'foreign_amount': 'decimal',
+        'foreign_currency': 'str',
+        'status': 'str',
+    }
+
+    # Spelled out, since this is what loading millions of them spends its time on
+    def __init__(self, source=None, account=None, id=None, charge_date=None, post_date=None, description=None,
+                 location=None, amount=None, currency=None, foreign_amount=None, foreign_currency=None, status=None):
+        self.source = source
+        self.account = account
+        self.id = id
+        self.charge_date = charge_date
+        self.post_date = post_date
+        self.description = description
+        self.location = location
+        self.amount = amount
+        self.currency = currency
+        self.foreign_amount = foreign_amount
+        self.foreign_currency = foreign_currency
+        self.status = status
+
+    @classmethod
+    def from_amex(cls, t, account):
+        # Swedish amex accounts are billed in SEK, which the api doesn't tell us
+        merchant = (t.get('extended_details') or {}).get('merchant') or {}
+        foreign = t.get('foreign_details') or {}
+        return cls(
+            source='amex',
+            account=account,
+            id=t.get('reference_id', None) or t.get('identifier', None),
+            charge_date=_date(t.get('charge_date', None)),
+            post_date=_date(t.get('post_date', None)),
+            description=t.get('description', None),
+            location=(merchant.get('address') or {}).get('country_name', None),
+            amount=_decimal(t.get('amount', None)),
+            currency='SEK',
+            foreign_amount=_decimal(foreign.get('amount', None)),
+            foreign_currency=foreign.get('iso_alpha_currency_code', None),
+            status=t.get('status', None),
+        )
+
+    @classmethod
+    def from_seb(cls, r, account):
+        # A row from parse_transaction_row(). The currency column is the one of the
+        # foreign amount, the amount is always in SEK.
+        return cls(
+            source='seb',
+            account=account,
+            id=r[0],
+            charge_date=_date(r[1]),
+            post_date=_date(r[2]),
+            description=r[3],
+            location=r[4] or None,
+            amount=_decimal(r[7]),
+            currency='SEK',
+            foreign_amount=_decimal(r[6]),
+            foreign_currency=r[6] and r[5] or None,
+        )
+
+    @classmethod
+    def from_revolut(cls, t, account):
+        # A tuple from parse_transaction() or parse_api_transaction()
+        return cls(
+            source='revolut',
+            account=account,
+            id=t[0],
+            charge_date=t[1].date(),
+            description=t[2],
+            amount=t[3],
+            currency=t[4],
+        )
+
+    @classmethod
+    def from_stored(cls, source, account, row):
+        # A row the way txstore stored it, where the dates and decimals of revolut
+        # have been turned into strings
+        if source == 'amex':
+            return cls.from_amex(row, account)
+        elif source == 'seb':
+            return cls.from_seb(row, account)
+        elif source == 'revolut':
+            return cls.from_revolut((row[0], datetime.datetime.fromisoformat(row[1]), row[2], Decimal(row[3]), row[4]), account)
+        raise ValueError("Unknown transaction source {}".format(source))
+
+    def key(self):
+        return (self.source, self.account, self.id)
+
+    def values(self):
+        return _values(self)
+
+    def as_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __eq__(self, other):
+        return isinstance(other, Transaction) and self.values() == other.values()
+
+    def __hash__(self):
+        return hash(self.values())
+
+    def __repr__(self):
+        return 'Transaction({})'.format(', '.join('{}={!r}'.format(k, getattr(self, k)) for k in self.__slots__))
+
+
+_values = operator.attrgetter(*Transaction.__slots__)
+
+
+class TransactionIndex(object):
+    # Remembers a hash of every transaction seen, by its key, so duplicates can be
+    # dropped as rows arrive without keeping the rows themselves around.
+    def __init__(self):
+        self._index = {}
+
+    def add(self, tx):
+        # True if the transaction is new, or has changed since it was last seen
+        h = hash(tx.values())
+        key = tx.key()
+        if self._index.get(key, None) == h:
+            return False
+        self._index[key] = h
+        return True
+
+    def __contains__(self, tx):
+        return self._index.get(tx.key(), None) == hash(tx.values())
+
+    def __len__(self):
+        return len(self._index)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+#
+# Local store of crawled transactions, keyed by the native id of each bank,
+# used to only emit new or changed transactions between runs.
+#
+
+import datetime
+import hashlib
+import json
+import sqlite3
+
+
+def _serialize(row):
+    # Rows are dicts (amex), lists of strings (seb) or tuples with dates and
+    # decimals (revolut), so fall back to str() for anything json can't handle.
+    return json.dumps(row, default=str, sort_keys=True)
+
+
+def _create(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS transactions (
+ seq integer NOT NULL PRIMARY KEY AUTOINCREMENT,
+ source text NOT NULL,
+ account text NOT NULL,
+ id text NOT NULL,
+ hash text NOT NULL,
+ data text NOT NULL,
+ first_seen timestamp NOT NULL,
+ last_changed timestamp NOT NULL,
+ UNIQUE (source, account, id)
+)""")
+    conn.commit()
+
+
+def create(filename):
+    # Create an empty store, if there isn't one already, so it can be read before
+    # anything has been stored in it
+    conn = sqlite3.connect(filename)
+    try:
+        _create(conn)
+    finally:
+        conn.close()
+
+
+def read(filename, source=None, account=None, after=0, since=None):
+    # Yield (seq, source, account, id, row) for every stored transaction with a seq
+    # after the given one (and stored or changed at or after the datetime since),
+    # optionally only of one source and account, in the order they were stored or
+    # last changed.
+    conn = sqlite3.connect(filename)
+    try:
+        query = "SELECT seq, source, account, id, data FROM transactions WHERE seq>?"
+        params = [after]
+        if source:
+            query += " AND source=?"
+            params.append(source)
+        if account:
+            query += " AND account=?"
+            params.append(account)
+        if since:
+            # Stored the way sqlite3 stores datetimes, which sorts as text
+            query += " AND last_changed>=?"
+            params.append(str(since))
+        for seq, source, account, txid, data in conn.execute(query + " ORDER BY seq", params):
+            yield seq, source, account, txid, json.loads(data)
+    finally:
+        conn.close()
+
+
+class TransactionStore(object):
+    def __init__(self, filename, source, account):
+        self.source = source
+        self.account = account
+        self.conn = sqlite3.connect(filename)
+        _create(self.conn)
+        # Hashes of everything we knew about before this run, so that checking if
+        # a row is known doesn't change because we have already stored parts of
+        # the current run.
+        self._known = dict(self.conn.execute(
+            "SELECT id, hash FROM transactions WHERE source=? AND account=?",
+            (source, account),
+        ))
+
+    def is_known(self, txid, row):
+        # True if this exact version of the transaction was stored before this run
+        return self._known.get(str(txid), None) == hashlib.sha1(_serialize(row).encode('utf8')).hexdigest()
+
+    def all_known(self, rows):
+        # True if a non-empty batch of (id, row) consists only of known and unchanged
+        # transactions. An empty batch tells us nothing, so it's never considered known.
+        return bool(rows) and all(self.is_known(txid, row) for txid, row in rows)
+
+    def update(self, rows):
+        # Store a batch of (id, row), and return the rows that were new or changed.
+        # A changed row gets a new seq, so readers can follow changes by seq.
+        changed = []
+        now = datetime.datetime.now()
+        with self.conn:
+            for txid, row in rows:
+                txid = str(txid)
+                data = _serialize(row)
+                h = hashlib.sha1(data.encode('utf8')).hexdigest()
+                cur = self.conn.execute(
+                    "SELECT hash, first_seen FROM transactions WHERE source=? AND account=? AND id=?",
+                    (self.source, self.account, txid),
+                ).fetchone()
+                if cur and cur[0] == h:
+                    continue
+                if cur:
+                    self.conn.execute(
+                        "DELETE FROM transactions WHERE source=? AND account=? AND id=?",
+                        (self.source, self.account, txid),
+                    )
+                self.conn.execute(
+                    "INSERT INTO transactions (source, account, id, hash, data, first_seen, last_changed) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (self.source, self.account, txid, h, data, cur and cur[1] or now, now),
+                )
+                changed.append(row)
+        return changed
+
+    def rows(self):
+        # Yield (id, row) of every stored transaction of this account
+        for txid, data in self.conn.execute(
+            "SELECT id, data FROM transactions WHERE source=? AND account=?",
+            (self.source, self.account),
+        ):
+            yield txid, json.loads(data)
+
+    def remove(self, txids):
+        # Remove transactions that don't exist anymore. Readers that follow the
+        # store by seq are not told, so this is only for rows that were replaced
+        # by another one (like a pending transaction once it's posted).
+        with self.conn:
+            self.conn.executemany(
+                "DELETE FROM transactions WHERE source=? AND account=? AND id=?",
+                [(self.source, self.account, str(txid)) for txid in txids],
+            )
+
+    def close(self):
+        self.conn.close()
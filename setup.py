@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+
+from setuptools import setup
+
+setup(
+    name='cardcrawler',
+    version='1.0',
+    description='Crawlers for credit card transactions from Amex, SEB cards and Revolut',
+    packages=['cardcrawler'],
+    python_requires='>=3.7',
+    install_requires=[
+        'requests',
+        'selenium<4',
+    ],
+    extras_require={
+        # Only needed for amex --sessioncache
+        'sessioncache': ['cryptography'],
+    },
+    entry_points={
+        'console_scripts': [
+            'cardcrawler = cardcrawler.cli:main',
+        ],
+    },
+)
@@ -0,0 +1,31 @@
+#
+# The tests run against the stand-in bank from benchmarks/, over http on
+# localhost, so nothing here needs a browser or the real sites.
+#
+
+import os
+import sys
+
+import pytest
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.join(root, 'benchmarks'))
+
+import standinbank  # noqa: E402
+
+
+@pytest.fixture
+def standin():
+    # Start a stand-in bank serving the given fixtures, and return it with its
+    # base url. Every one started is stopped after the test.
+    banks = []
+
+    def start(fixtures):
+        bank = standinbank.StandinBank(fixtures)
+        baseurl = bank.start()
+        banks.append(bank)
+        return bank, baseurl
+    yield start
+    for bank in banks:
+        bank.stop()
@@ -0,0 +1,201 @@
+#
+# The amex api client against the stand-in: paging and merging statements,
+# the response cache, --since-last-sync and the dashboard's transit decoder.
+#
+
+import argparse
+
+import pytest
+
+import standinbank
+from cardcrawler import amex
+from cardcrawler import responsecache
+from cardcrawler import txstore
+
+
+def login(baseurl, monkeypatch, workers=4):
+    monkeypatch.setattr(amex, 'baseurl', baseurl)
+    sess = amex.create_session(workers)
+    sess.post(baseurl + '/sv-se/account/login', data={}).raise_for_status()
+    return sess
+
+
+def statementends(fixtures):
+    return [s['statement_end_date'] for s in fixtures['amex']['statement_periods']]
+
+
+class ListWriter(object):
+    def __init__(self):
+        self.rows = []
+
+    def write(self, row):
+        self.rows.append(row)
+
+    def flush(self):
+        pass
+
+
+def test_pages_statement_over_pagesize(standin, monkeypatch):
+    fixtures = standinbank.synthetic_fixtures(2500, statements=1)
+    (bank, baseurl) = standin(fixtures)
+    sess = login(baseurl, monkeypatch)
+    token = fixtures['amex']['cards'][0]['token']
+    (end,) = statementends(fixtures)
+
+    ((s, transactions, e),) = amex.fetch_statements(sess, token, [end], 4, pending=True)
+    assert e is None
+    posted = fixtures['amex']['transactions'][end]
+    pending = fixtures['amex']['pending'][end]
+    assert len(posted) > amex.pagesize
+    # Pending first, and only they have a status until the posted ones are stored
+    assert [amex.transaction_id(t) for t in transactions] == [amex.transaction_id(t) for t in pending + posted]
+    assert [t.get('status', None) for t in transactions] == ['pending'] * len(pending) + [None] * len(posted)
+
+
+def test_pages_without_total_count(standin, monkeypatch):
+    fixtures = standinbank.synthetic_fixtures(2000, statements=1)
+    (bank, baseurl) = standin(fixtures)
+    sess = login(baseurl, monkeypatch)
+    token = fixtures['amex']['cards'][0]['token']
+    (end,) = statementends(fixtures)
+
+    # Without a total, pages are fetched for as long as they come back full
+    fetch_page = amex.fetch_page
+    monkeypatch.setattr(amex, 'fetch_page', lambda *args: (fetch_page(*args)[0], None))
+    ((s, transactions, e),) = amex.fetch_statements(sess, token, [end], 4)
+    assert e is None
+    assert len(transactions) == len(fixtures['amex']['transactions'][end])
+
+
+def test_fewer_than_total_count_fails_statement(standin, monkeypatch):
+    fixtures = standinbank.synthetic_fixtures(1500, statements=1)
+    (bank, baseurl) = standin(fixtures)
+    sess = login(baseurl, monkeypatch)
+    token = fixtures['amex']['cards'][0]['token']
+    (end,) = statementends(fixtures)
+
+    # A transaction goes missing from the second page
+    fetch_page = amex.fetch_page
+
+    def lossy(sess, token, statementend, status, offset):
+        (transactions, total) = fetch_page(sess, token, statementend, status, offset)
+        return offset and transactions[1:] or transactions, total
+    monkeypatch.setattr(amex, 'fetch_page', lossy)
+    ((s, transactions, e),) = amex.fetch_statements(sess, token, [end], 4)
+    assert transactions is None
+    assert 'Only got 1499 of 1500' in str(e)
+
+
+def test_merge_pages_drops_moved_duplicates():
+    (a, b, c) = ({'reference_id': 'a'}, {'reference_id': 'b'}, {'reference_id': 'c'})
+    listing = {'pages': {amex.pagesize: [b, c], 0: [a, b]}, 'total': 4, 'npages': 2}
+    assert amex.merge_pages([('posted', listing)]) == [a, b, c]
+
+
+def test_closed_statements_come_from_response_cache(standin, monkeypatch, tmp_path):
+    fixtures = standinbank.synthetic_fixtures(300, statements=3)
+    (bank, baseurl) = standin(fixtures)
+    sess = login(baseurl, monkeypatch)
+    token = fixtures['amex']['cards'][0]['token']
+    ends = statementends(fixtures)
+    cache = responsecache.ResponseCache(str(tmp_path / 'cache'))
+
+    first = list(amex.fetch_statements(sess, token, ends, 4, cache=cache))
+    before = bank.requests
+    second = list(amex.fetch_statements(sess, token, ends, 4, cache=cache))
+    cache.close()
+    # Only the one page of the open statement is fetched again
+    assert bank.requests - before == 1
+    assert second == first
+
+
+def test_since_last_sync_stops_at_synced_statement(standin, monkeypatch, tmp_path):
+    fixtures = standinbank.synthetic_fixtures(300, statements=3)
+    (bank, baseurl) = standin(fixtures)
+    sess = login(baseurl, monkeypatch)
+    token = fixtures['amex']['cards'][0]['token']
+    ends = statementends(fixtures)
+    store = str(tmp_path / 'store.db')
+    args = argparse.Namespace(months=3, store=store, workers=4, pending=False, since_last_sync=False)
+    writer = ListWriter()
+    assert amex.crawl_card(sess, token, args, writer) == 0
+    assert len(writer.rows) == 300
+
+    # A change in the oldest statement is never seen, since the one after it is
+    # already synced and closed statements don't change
+    changed = fixtures['amex']['transactions'][ends[-1]][0]
+    changed['description'] = 'CHANGED'
+    args.since_last_sync = True
+    writer = ListWriter()
+    assert amex.crawl_card(sess, token, args, writer) == 0
+    assert writer.rows == []
+    stored = [row for seq, source, account, txid, row in txstore.read(store) if txid == changed['reference_id']]
+    assert stored[0]['description'] != 'CHANGED'
+
+
+def test_pending_transaction_replaced_once_posted(standin, monkeypatch, tmp_path):
+    fixtures = standinbank.synthetic_fixtures(100, statements=2)
+    (bank, baseurl) = standin(fixtures)
+    sess = login(baseurl, monkeypatch)
+    token = fixtures['amex']['cards'][0]['token']
+    end = statementends(fixtures)[0]
+    store = str(tmp_path / 'store.db')
+    args = argparse.Namespace(months=2, store=store, workers=4, pending=True, since_last_sync=True)
+    amex.crawl_card(sess, token, args, ListWriter())
+
+    t = fixtures['amex']['pending'][end].pop()
+    t = dict(t, reference_id='1' * 24, post_date=t['charge_date'])
+    fixtures['amex']['transactions'][end].insert(0, t)
+    writer = ListWriter()
+    amex.crawl_card(sess, token, args, writer)
+    assert [(r['identifier'], r['status']) for r in writer.rows] == [(t['identifier'], 'posted')]
+    ids = [txid for seq, source, account, txid, row in txstore.read(store)]
+    assert t['reference_id'] in ids
+    assert t['identifier'] not in ids
+
+
+def test_transaction_id():
+    assert amex.transaction_id({'reference_id': 'R', 'identifier': 'I'}) == 'R'
+    assert amex.transaction_id({'identifier': 'I'}) == 'I'
+    assert amex.transaction_id({'amount': 1}) == '{"amount": 1}'
+
+
+@pytest.mark.parametrize('code, index', [('^0', 0), ('^1', 1), ('^Z', 42), ('^[', 43), ('^10', 44), ('^1A', 61), ('^[[', 44 * 44 - 1)])
+def test_transit_cache_index(code, index):
+    assert amex._transit_cache_index(code) == index
+
+
+def test_decode_initial_state_cache_references():
+    # Map keys longer than 3 characters (and tags) are cached the first time they
+    # are seen, and after that only referred to by their place in the cache
+    state = ['^ ',
+             'account', ['^ ', 'name', 'Main', 'balance', 12],
+             'cards', ['~#iM', ['^0', ['^ ', '^1', 'Other']]],
+             'other', ['^ ', '^0', 'x', '^2', 'y']]
+    (decoded, index) = amex.decode_initial_state(state)
+    assert decoded == {
+        'account': {'name': 'Main', 'balance': 12},
+        'cards': {'account': {'name': 'Other'}},
+        'other': {'account': 'x', 'balance': 'y'},
+    }
+    assert index['name'] == ['Main', 'Other']
+    assert index['balance'] == [12, 'y']
+
+
+def test_decode_initial_state_two_digit_references():
+    keys = ['key{:02d}'.format(n) for n in range(50)]
+    first = ['^ ']
+    for n, k in enumerate(keys):
+        first += [k, n]
+    # aaaa is cached first, then key00 to key49, and then bbbb
+    state = ['^ ', 'aaaa', first, 'bbbb', ['^ ', '^10', 'a', '^11', 'b', '^17', 'c']]
+    (decoded, index) = amex.decode_initial_state(state)
+    assert decoded['aaaa'] == dict((k, n) for n, k in enumerate(keys))
+    assert decoded['bbbb'] == {'key43': 'a', 'key44': 'b', 'bbbb': 'c'}
+
+
+def test_parse_cards_from_dashboard(standin, monkeypatch):
+    fixtures = standinbank.synthetic_fixtures(10, statements=1)
+    (bank, baseurl) = standin(fixtures)
+    sess = login(baseurl, monkeypatch)
+    assert amex.get_cards(sess) == fixtures['amex']['cards']
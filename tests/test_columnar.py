@@ -0,0 +1,44 @@
+#
+# Transactions written in the columnar format read back the same.
+#
+
+import datetime
+import io
+from decimal import Decimal
+
+import standinbank
+from cardcrawler import columnar
+from cardcrawler.transaction import Transaction
+
+
+def roundtrip(rows, **kwargs):
+    f = io.BytesIO()
+    writer = columnar.ColumnarWriter(f, **kwargs)
+    for r in rows:
+        writer.write(r)
+    writer.close()
+    f.seek(0)
+    return list(columnar.ColumnarReader(f))
+
+
+def test_roundtrip_over_several_blocks():
+    rows = [
+        Transaction('seb', '197001011234/saseurobonus', 'a', datetime.date(2021, 3, 1), datetime.date(2021, 3, 2),
+                    'ICA NÄRA', 'STOCKHOLM', Decimal('12.5'), 'SEK', Decimal('1.125'), 'EUR', None),
+        Transaction('revolut', '0701234567', 'b', datetime.date(1999, 12, 31), None,
+                    '', None, Decimal('-3000'), 'SEK', None, None, 'pending'),
+        Transaction(),
+    ] * 3
+    assert roundtrip(rows, blocksize=2) == rows
+
+
+def test_roundtrip_amex_transactions():
+    fixtures = standinbank.synthetic_fixtures(500, statements=2)
+    transactions = [t for txs in fixtures['amex']['transactions'].values() for t in txs]
+    transactions += [t for txs in fixtures['amex']['pending'].values() for t in txs]
+    normalize = lambda t: Transaction.from_amex(t, 'STANDIN0TOKEN1')  # noqa: E731
+    assert roundtrip(transactions, normalize=normalize, blocksize=100) == [normalize(t) for t in transactions]
+
+
+def test_empty_file():
+    assert roundtrip([]) == []
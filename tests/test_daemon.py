@@ -0,0 +1,53 @@
+#
+# The daemon's api, without any accounts.
+#
+
+import argparse
+import json
+import os
+import stat
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from cardcrawler import daemon
+
+
+@pytest.fixture
+def api(tmp_path):
+    # Serve the api of a daemon with an empty store, and return its base url
+    d = daemon.Daemon(str(tmp_path / 'store.db'), 300)
+    server = daemon.create_server(argparse.Namespace(socket=None, listen='127.0.0.1:0'))
+    server.crawlerdaemon = d
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield 'http://127.0.0.1:{}'.format(server.server_address[1])
+    d.stop()
+    server.shutdown()
+    server.server_close()
+
+
+def get(url):
+    try:
+        with urllib.request.urlopen(url, timeout=10) as r:
+            return r.status, json.loads(r.read().decode('utf8'))
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read().decode('utf8'))
+
+
+def test_transactions_on_empty_store(api):
+    assert get(api + '/transactions?after=5') == (200, {'last': 5, 'transactions': []})
+
+
+@pytest.mark.parametrize('wait', ['nan', 'inf', '-1', 'soon'])
+def test_transactions_rejects_bad_wait(api, wait):
+    (code, body) = get(api + '/transactions?wait=' + wait)
+    assert code == 400
+
+
+def test_socket_only_accessible_to_owner(tmp_path):
+    path = str(tmp_path / 'api.sock')
+    server = daemon.create_server(argparse.Namespace(socket=path, listen=None))
+    server.server_close()
+    assert stat.S_IMODE(os.stat(path).st_mode) & 0o077 == 0